@@ -1,12 +1,4 @@
-import sqlite3
+# Same as: python -m cnc_iiot.cli.inspect rows
+from cnc_iiot.cli.inspect import main
 
-conn = sqlite3.connect("cnc_iiot.db")
-cur = conn.cursor()
-
-telemetry_count = cur.execute("SELECT COUNT(*) FROM telemetry").fetchone()[0]
-event_count = cur.execute("SELECT COUNT(*) FROM events").fetchone()[0]
-
-print("Telemetry rows:", telemetry_count)
-print("Event rows:", event_count)
-
-conn.close()
+main(["rows"])
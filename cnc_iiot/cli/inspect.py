@@ -0,0 +1,79 @@
+# cnc_iiot/cli/inspect.py
+# CNC IIoT - DB inspection CLI (replaces check_db.py / check_db_v1.py / inspect_db.py)
+#
+# Usage:
+#   python -m cnc_iiot.cli.inspect rows
+#   python -m cnc_iiot.cli.inspect check
+#   python -m cnc_iiot.cli.inspect schema tables
+#   python -m cnc_iiot.cli.inspect rows --db "C:\path\to\cnc_iiot.db"
+from __future__ import annotations
+
+import argparse
+import sqlite3
+from typing import Callable, Dict, List, Optional
+
+from cnc_iiot.db import DB_PATH_DEFAULT, managed_conn
+
+
+def rows(conn: sqlite3.Connection) -> None:
+    # Same two lines check_db.py always printed
+    cur = conn.cursor()
+    print("Telemetry rows:", cur.execute("SELECT COUNT(*) FROM telemetry").fetchone()[0])
+    print("Event rows:", cur.execute("SELECT COUNT(*) FROM events").fetchone()[0])
+
+
+def check(conn: sqlite3.Connection) -> None:
+    cur = conn.cursor()
+    print("Telemetry rows:", cur.execute("SELECT COUNT(*) FROM telemetry").fetchone()[0])
+    print("Events rows:", cur.execute("SELECT COUNT(*) FROM events").fetchone()[0])
+    print("Jobs rows:", cur.execute("SELECT COUNT(*) FROM jobs").fetchone()[0])
+
+    print("\nTelemetry ts -> ts_utc (first 3):")
+    for row in cur.execute("SELECT ts, ts_utc, mpos_x, mpos_y, mpos_z FROM telemetry LIMIT 3"):
+        print(row)
+
+    print("\nEvents ts -> ts_utc (first 3):")
+    for row in cur.execute("SELECT ts, ts_utc, event_type, category FROM events LIMIT 3"):
+        print(row)
+
+
+def schema(conn: sqlite3.Connection) -> None:
+    cur = conn.cursor()
+
+    print("\n--- TELEMETRY COLUMNS ---")
+    for row in cur.execute("PRAGMA table_info(telemetry)"):
+        print(row)
+
+    print("\n--- EVENTS COLUMNS ---")
+    for row in cur.execute("PRAGMA table_info(events)"):
+        print(row)
+
+
+def tables(conn: sqlite3.Connection) -> None:
+    print("\n--- TABLES ---")
+    for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'"):
+        print(row[0])
+
+
+COMMANDS: Dict[str, Callable[[sqlite3.Connection], None]] = {
+    "rows": rows,
+    "check": check,
+    "schema": schema,
+    "tables": tables,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="CNC IIoT DB inspection")
+    parser.add_argument("commands", nargs="+", choices=list(COMMANDS), help="One or more checks to run, in order")
+    parser.add_argument("--db", default=DB_PATH_DEFAULT, help="Path to SQLite DB (default: cnc_iiot.db)")
+    args = parser.parse_args(argv)
+
+    # One read-only connection shared by every requested command
+    with managed_conn(args.db, readonly=True) as conn:
+        for name in args.commands:
+            COMMANDS[name](conn)
+
+
+if __name__ == "__main__":
+    main()
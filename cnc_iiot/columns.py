@@ -0,0 +1,87 @@
+# cnc_iiot/columns.py
+# Column detection / quoting and numeric folding shared by job_compare and job_drilldown.
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def get_table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    cur = conn.cursor()
+    rows = cur.execute(f"PRAGMA table_info({table})").fetchall()
+    return [r[1] for r in rows]
+
+
+def get_column_types(conn: sqlite3.Connection, table: str) -> Dict[str, str]:
+    rows = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    return {r[1]: r[2] or "" for r in rows}
+
+
+def has_numeric_affinity(decl_type: str) -> bool:
+    # SQLite affinity rules: only INTEGER/REAL/NUMERIC columns store numeric-looking text as numbers
+    t = decl_type.upper()
+    if "INT" in t:
+        return True
+    if not t or any(k in t for k in ("CHAR", "CLOB", "TEXT", "BLOB")):
+        return False
+    return True
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def select_list(cols: List[Optional[str]], allowed: List[str]) -> str:
+    """Quoted SELECT list of the detected columns (None skipped); anything not in `allowed` is rejected."""
+    picked = [c for c in cols if c]
+    unknown = [c for c in picked if c not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {unknown}")
+    return ", ".join(quote_ident(c) for c in picked)
+
+
+def pick_first(cols: List[str], candidates: List[str]) -> Optional[str]:
+    lower = {c.lower(): c for c in cols}
+    for cand in candidates:
+        if cand.lower() in lower:
+            return lower[cand.lower()]
+    return None
+
+
+def fetch_rows(cur: sqlite3.Cursor, query: str, params: Tuple[Any, ...] = ()) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """Column names + plain row tuples; callers index by position instead of building a dict per row."""
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    return [d[0] for d in cur.description], rows
+
+
+def numeric_array(values: Tuple[Any, ...]) -> np.ndarray:
+    """
+    float64 array of the values float() accepts (None / non-numeric text dropped).
+    One vectorized conversion first; only parses value-by-value if that fails.
+    """
+    arr = np.asarray(values, dtype=object)
+    arr = arr[arr != None]  # noqa: E711 - elementwise on object arrays
+    try:
+        return arr.astype(np.float64)
+    except (ValueError, TypeError):
+        pass
+    out = []
+    for v in arr.tolist():
+        try:
+            out.append(float(v))
+        except (ValueError, TypeError):
+            continue
+    return np.asarray(out, dtype=np.float64)
+
+
+def add_numeric(acc: List[Any], values: Tuple[Any, ...]) -> None:
+    """Fold one batch of raw column values into a running [sum, count, max]."""
+    arr = numeric_array(values)
+    if arr.size:
+        acc[0] += float(arr.sum())
+        acc[1] += int(arr.size)
+        m = float(arr.max())
+        acc[2] = m if acc[2] is None else max(acc[2], m)
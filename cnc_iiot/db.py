@@ -0,0 +1,135 @@
+# cnc_iiot/db.py
+from __future__ import annotations
+
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Union
+
+DB_PATH_DEFAULT = "cnc_iiot.db"
+
+# Applied to every connection. WAL lets the dashboard read while ingest writes;
+# the rest trades fsyncs and disk reads for RAM (64 MiB page cache, 256 MiB mmap).
+PRAGMAS = """
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-65536;
+PRAGMA mmap_size=268435456;
+"""
+
+
+class Connection(sqlite3.Connection):
+    """sqlite3.Connection that can be weak-referenced, so per-connection caches drop it once it's gone."""
+
+
+def connect_db(
+    path: Union[str, Path] = DB_PATH_DEFAULT, *, readonly: bool = False, check_same_thread: bool = True
+) -> sqlite3.Connection:
+    """
+    Open the CNC IIoT SQLite DB with the shared performance PRAGMAs applied.
+    readonly=True opens via a mode=ro URI. journal_mode is stored in the DB file,
+    so read-only callers still get WAL once any writer has switched it on.
+    check_same_thread=False is for long-lived handles shared across threads (dashboard).
+    """
+    if readonly:
+        uri = f"{Path(path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread, factory=Connection)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=check_same_thread, factory=Connection)
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(PRAGMAS)
+    return conn
+
+
+def optimize_db(conn: sqlite3.Connection) -> None:
+    """
+    PRAGMA optimize so the query planner keeps sqlite_stat1 fresh (bounded by analysis_limit).
+    Needs a writable connection - call it on write paths just before closing.
+    """
+    conn.execute("PRAGMA analysis_limit=400")
+    conn.execute("PRAGMA optimize")
+
+
+@contextmanager
+def managed_conn(path: Union[str, Path] = DB_PATH_DEFAULT, *, readonly: bool = False) -> Iterator[sqlite3.Connection]:
+    """
+    connect_db() as a context manager. Writable connections run optimize_db() before
+    closing; read-only ones can't write sqlite_stat1, so they just close.
+    """
+    conn = connect_db(path, readonly=readonly)
+    try:
+        yield conn
+        if not readonly:
+            optimize_db(conn)
+    finally:
+        conn.close()
+
+
+# Per-process connection pool: one shared writer per DB file, one read-only
+# handle per (thread, DB file). All of them see the same WAL.
+_writers: Dict[str, sqlite3.Connection] = {}
+_readers = threading.local()
+
+
+def get_writer(path: Union[str, Path] = DB_PATH_DEFAULT) -> sqlite3.Connection:
+    """
+    The process-wide read-write connection for path, opened on first use; optimized and closed at exit.
+    SQLite takes one writer at a time anyway, so callers share it instead of opening their own.
+    Don't close it; wrap writes in `with conn:` to commit. Use it from the thread that opened it.
+    """
+    key = str(Path(path).resolve())
+    conn = _writers.get(key)
+    if conn is None:
+        conn = _writers[key] = connect_db(path)
+        atexit.register(_close_writer, conn)
+    return conn
+
+
+def _close_writer(conn: sqlite3.Connection) -> None:
+    optimize_db(conn)
+    conn.close()
+
+
+def get_reader(path: Union[str, Path] = DB_PATH_DEFAULT) -> sqlite3.Connection:
+    """
+    A read-only connection for path, cached per thread (sqlite3 connections are single-thread).
+    Don't close it; it lives as long as the thread.
+    """
+    key = str(Path(path).resolve())
+    conns = getattr(_readers, "conns", None)
+    if conns is None:
+        conns = _readers.conns = {}
+    conn = conns.get(key)
+    if conn is None:
+        conn = conns[key] = connect_db(path, readonly=True)
+    return conn
+
+
+# (name, table, columns) - composite indexes for the per-job report lookups.
+# idx_*_job is (job_id) on purpose: every SQLite index ends in the rowid, so it already
+# is (job_id, id) and serves WHERE job_id=? ORDER BY id [DESC LIMIT n] without a sort.
+# Same names as migrate_schema_v1, so DBs that already have them are left alone.
+INDEXES = [
+    ("idx_telemetry_job", "telemetry", ("job_id",)),
+    ("idx_events_job", "events", ("job_id",)),
+    ("idx_tel_job_ts", "telemetry", ("job_id", "ts_utc")),
+    ("idx_tel_job_state", "telemetry", ("job_id", "state")),
+    ("idx_ev_job_type", "events", ("job_id", "event_type")),
+    ("idx_ev_job_ts", "events", ("job_id", "ts_utc")),
+    ("idx_jobs_created", "jobs", ("created_ts_utc",)),
+]
+
+
+def ensure_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Create the report indexes if missing. Needs a writable connection.
+    Indexes whose columns don't exist in this schema version are skipped.
+    """
+    for name, table, cols in INDEXES:
+        existing = {r[1].lower() for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+        if not all(c in existing for c in cols):
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(cols)})")
+    conn.commit()
@@ -0,0 +1,20 @@
+# cnc_iiot/export.py
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def write_json(path: str, obj: Any) -> None:
+    # orjson (optional C extension) writes the same indent=2 layout much faster
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
@@ -0,0 +1,59 @@
+# cnc_iiot/grbl_parse.py
+# GRBL line classifier + status parser, shared by log_to_db.py (ingest) and read_grbl_log.py (demo print).
+# Plain str ops with full annotations (mypyc-friendly); there is no build step, it runs as plain Python.
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+
+def parse_status(line: str) -> Tuple[str, float, float, float, int, int]:
+    """(state, x, y, z, feed, spindle) from a '<State|MPos:x,y,z|FS:feed,spindle|...>' status line."""
+    content = line.strip("<>")
+    bar = content.find("|")
+    state = content[:bar] if bar >= 0 else content
+
+    # locate the fields with find() and slice them out - no split list of every field.
+    # Anchored on the leading "|" so only whole fields match; first MPos:/FS: wins.
+    mp = content.find("|MPos:")
+    fs = content.find("|FS:")
+    if mp < 0 or fs < 0:
+        raise ValueError(f"status line without MPos/FS: {line!r}")
+    mp += 6
+    fs += 4
+    mp_end = content.find("|", mp)
+    fs_end = content.find("|", fs)
+    pos_part = content[mp:mp_end] if mp_end >= 0 else content[mp:]
+    fs_part = content[fs:fs_end] if fs_end >= 0 else content[fs:]
+
+    x, y, z = pos_part.split(",")
+    feed, spindle = fs_part.split(",")
+    return state, float(x), float(y), float(z), int(feed), int(spindle)
+
+
+def parse_grbl_line(line: str) -> Optional[Tuple[str, tuple]]:
+    """
+    Classify one GRBL line without touching the DB. Returns
+    ("tel", (state, x, y, z, feed, spindle, raw)) or
+    ("evt", (event_type, message, raw, level, category, code)); None for blank lines.
+    """
+    line = line.strip()
+    if not line:
+        return None
+
+    # dispatch on the first char; status lines are the common case, so they go first
+    c = line[0]
+    if c == "<" and line.endswith(">"):
+        state, x, y, z, feed, spindle = parse_status(line)
+        return "tel", (state, x, y, z, feed, spindle, line)
+
+    elif c == "A" and line.startswith("ALARM:"):
+        return "evt", ("alarm", line, line, "error", "grbl", "ALARM")
+
+    elif c == "o" and line == "ok":
+        return "evt", ("ok", "Command acknowledged", line, "info", "system", None)
+
+    elif c in "Gg" and line[:4].lower() == "grbl":
+        return "evt", ("startup", "GRBL startup banner", line, "info", "system", None)
+
+    else:
+        return "evt", ("raw", "Unclassified line", line, "info", "system", None)
@@ -0,0 +1,138 @@
+# cnc_iiot/summary.py
+# Per-job aggregates shared by the report scripts (daily/weekly summaries, job reports).
+from __future__ import annotations
+
+import sqlite3
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+from cnc_iiot.timeutil import compute_duration
+
+# One pass over the job's telemetry: per-state counts + job-wide totals via window functions
+TELEMETRY_STATS_SQL = """
+    SELECT state,
+           COUNT(*) AS c,
+           SUM(COUNT(*)) OVER () AS total,
+           MIN(MIN(ts_utc)) OVER () AS t0,
+           MAX(MAX(ts_utc)) OVER () AS t1
+    FROM telemetry
+    WHERE job_id=?
+    GROUP BY state
+    ORDER BY c DESC
+"""
+
+
+# conn -> (schema_version, {table: columns}). Weak keys, so closed report connections and
+# get_reader() handles of finished threads drop out instead of being pinned by the cache.
+_table_columns_cache: "weakref.WeakKeyDictionary[sqlite3.Connection, Tuple[int, Dict[str, Dict[str, str]]]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> Dict[str, str]:
+    """lowercase name -> real column name. table_xinfo so generated columns (events.is_alarm) are included.
+    Cached per connection until its schema_version changes (e.g. migrate_schema_v2 under a live dashboard);
+    plain sqlite3.connect() handles can't be weak-referenced and are just re-read (connect_db's can)."""
+    version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    try:
+        cached = _table_columns_cache.get(conn)
+    except TypeError:
+        tables: Dict[str, Dict[str, str]] = {}
+    else:
+        if cached is None or cached[0] != version:
+            cached = _table_columns_cache[conn] = (version, {})
+        tables = cached[1]
+
+    cols = tables.get(table)
+    if cols is None:
+        cols = tables[table] = {r[1].lower(): r[1] for r in conn.execute(f"PRAGMA table_xinfo({table})").fetchall()}
+    return cols
+
+
+def event_columns(conn: sqlite3.Connection) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """(job_col, type_col, msg_col) for the events table."""
+    lower = table_columns(conn, "events")
+    job_col = lower.get("job_id")
+    type_col = lower.get("event_type") or lower.get("type") or lower.get("level") or lower.get("category")
+    msg_col = lower.get("message") or lower.get("msg") or lower.get("detail") or lower.get("details") or lower.get("text")
+    return job_col, type_col, msg_col
+
+
+def telemetry_columns(conn: sqlite3.Connection) -> Tuple[Optional[str], Optional[str]]:
+    """(job_col, ts_col) for the telemetry table."""
+    lower = table_columns(conn, "telemetry")
+    job_col = lower.get("job_id")
+    ts_col = lower.get("ts_utc") or lower.get("timestamp_utc") or lower.get("timestamp") or lower.get("ts")
+    return job_col, ts_col
+
+
+def alarm_predicate(conn: sqlite3.Connection) -> Optional[str]:
+    """SQL condition matching alarm events (type or message contains 'alarm'), or None if undetectable."""
+    _, type_col, msg_col = event_columns(conn)
+    # migrate_schema_v2's generated is_alarm encodes this exact rule over event_type/message,
+    # and its partial index idx_events_alarm only matches a literal "is_alarm = 1"
+    if "is_alarm" in table_columns(conn, "events") and (type_col, msg_col) == ("event_type", "message"):
+        return "is_alarm = 1"
+    preds = [f"LOWER({c}) LIKE '%alarm%'" for c in (type_col, msg_col) if c]
+    return "(" + " OR ".join(preds) + ")" if preds else None
+
+
+def stage_job_ids(conn: sqlite3.Connection, job_ids: List[int]) -> None:
+    """Load job_ids into TEMP table job_ids so aggregates can JOIN it (no IN-list length limit)."""
+    conn.executescript("CREATE TEMP TABLE IF NOT EXISTS job_ids(id INTEGER PRIMARY KEY); DELETE FROM job_ids;")
+    conn.executemany("INSERT OR IGNORE INTO job_ids VALUES (?)", [(i,) for i in job_ids])
+
+
+def telemetry_spans_by_job(
+    conn: sqlite3.Connection, job_ids: List[int], sample_interval_s_default: float = 1.0
+) -> Dict[int, float]:
+    """Telemetry span (first..last ts) per job, for all job_ids in one grouped query.
+    If timestamps are identical, fall back to (samples-1) * sample_interval_s_default.
+    """
+    if not job_ids:
+        return {}
+    cur = conn.cursor()
+    job_col, ts_col = telemetry_columns(conn)
+
+    if not job_col or not ts_col:
+        return {}
+
+    stage_job_ids(conn, job_ids)
+    # CROSS JOIN pins job_ids as the outer loop -> one index seek per job
+    rows = cur.execute(
+        f"""
+        SELECT j.id, MIN(t.{ts_col}), MAX(t.{ts_col}), COUNT(*)
+        FROM job_ids j CROSS JOIN telemetry t ON t.{job_col} = j.id
+        GROUP BY j.id
+        """
+    ).fetchall()
+
+    spans = {}
+    for jid, first_ts, last_ts, samples in rows:
+        span = compute_duration(first_ts, last_ts)
+        if span == 0.0 and samples > 1:
+            span = (samples - 1) * sample_interval_s_default
+        spans[int(jid)] = span
+    return spans
+
+
+def alarm_counts_by_job(conn: sqlite3.Connection, job_ids: List[int]) -> Dict[int, int]:
+    """Alarm event count per job, for all job_ids in one grouped query."""
+    if not job_ids:
+        return {}
+    cur = conn.cursor()
+    job_col = event_columns(conn)[0]
+    pred = alarm_predicate(conn)
+    if not job_col or not pred:
+        return {}
+
+    stage_job_ids(conn, job_ids)
+    rows = cur.execute(
+        f"""
+        SELECT j.id, COUNT(*)
+        FROM job_ids j CROSS JOIN events e ON e.{job_col} = j.id
+        WHERE {pred}
+        GROUP BY j.id
+        """
+    ).fetchall()
+    return {int(jid): n for jid, n in rows}
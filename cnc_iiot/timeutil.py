@@ -0,0 +1,31 @@
+# cnc_iiot/timeutil.py
+# One ISO-8601 parser for every report, so they all read the same timestamps the same way.
+from __future__ import annotations
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+
+@lru_cache(maxsize=4096)
+def iso_to_dt(s: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a stored timestamp ("...+00:00", legacy naive, or trailing "Z"); None if empty/invalid.
+    Python 3.11+ fromisoformat handles "Z" itself. Memoized: job times and telemetry
+    first/last stamps repeat across KPIs, prints and exports.
+    """
+    if not s:
+        return None
+    try:
+        return datetime.fromisoformat(s)
+    except ValueError:
+        return None
+
+
+def compute_duration(start_iso: Optional[str], end_iso: Optional[str]) -> float:
+    """Seconds between two stored timestamps; 0.0 if either is missing/invalid or end < start."""
+    sdt = iso_to_dt(start_iso)
+    edt = iso_to_dt(end_iso)
+    if not sdt or not edt:
+        return 0.0
+    return max(0.0, (edt - sdt).total_seconds())
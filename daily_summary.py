@@ -14,20 +14,15 @@
 import argparse
 import os
 import sqlite3
+from collections import Counter
 from datetime import datetime, date, timedelta, UTC
-from typing import Optional, Any, Dict, List
-
-DB_PATH_DEFAULT = "cnc_iiot.db"
+from typing import Optional, List
 
+from cnc_iiot.db import managed_conn
+from cnc_iiot.summary import alarm_counts_by_job, telemetry_spans_by_job
+from cnc_iiot.timeutil import compute_duration
 
-def iso_to_dt(s: Optional[str]) -> Optional[datetime]:
-    if not s:
-        return None
-    s2 = s.replace("Z", "+00:00")
-    try:
-        return datetime.fromisoformat(s2)
-    except ValueError:
-        return None
+DB_PATH_DEFAULT = "cnc_iiot.db"
 
 
 def ensure_dir(path: str) -> None:
@@ -52,100 +47,31 @@ def human_secs(seconds: float) -> str:
     return f"{sec}s"
 
 
-def compute_duration(start_iso: Optional[str], end_iso: Optional[str]) -> float:
-    sdt = iso_to_dt(start_iso)
-    edt = iso_to_dt(end_iso)
-    if not sdt or not edt:
-        return 0.0
-    return max(0.0, (edt - sdt).total_seconds())
+def fetch_jobs(
+    conn: sqlite3.Connection, start_date: Optional[date] = None, end_date: Optional[date] = None
+) -> List[sqlite3.Row]:
+    """Jobs ordered by id, optionally limited to created_ts_utc dates within [start_date, end_date]."""
+    where = ""
+    params: List[str] = []
+    if start_date and end_date:
+        # Plain YYYY-MM-DD bounds: any ISO timestamp on day d sorts >= "d" and < "d+1",
+        # with or without a UTC offset / Z suffix.
+        where = "WHERE created_ts_utc >= ? AND created_ts_utc < ?"
+        params = [start_date.isoformat(), (end_date + timedelta(days=1)).isoformat()]
 
-
-def fetch_jobs(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
     cur = conn.cursor()
-    rows = cur.execute(
-        """
+    cur.row_factory = sqlite3.Row
+    return cur.execute(
+        f"""
         SELECT id, job_name, status, material, notes,
                created_ts_utc, started_ts_utc, finished_ts_utc
         FROM jobs
+        {where}
         ORDER BY id ASC
-        """
-    ).fetchall()
-
-    cols = ["id", "job_name", "status", "material", "notes", "created_ts_utc", "started_ts_utc", "finished_ts_utc"]
-    return [{cols[i]: r[i] for i in range(len(cols))} for r in rows]
-
-
-def filter_jobs_by_date_range(jobs: List[Dict[str, Any]], start_date: date, end_date: date) -> List[Dict[str, Any]]:
-    out = []
-    for j in jobs:
-        created = iso_to_dt(j.get("created_ts_utc"))
-        if not created:
-            continue
-        d = created.date()
-        if start_date <= d <= end_date:
-            out.append(j)
-    return out
-
-
-def count_alarm_events(conn: sqlite3.Connection, job_id: int) -> int:
-    cur = conn.cursor()
-    cols = [r[1] for r in cur.execute("PRAGMA table_info(events)").fetchall()]
-    lower = {c.lower(): c for c in cols}
-
-    job_col = lower.get("job_id")
-    type_col = lower.get("event_type") or lower.get("type") or lower.get("level") or lower.get("category")
-    msg_col = lower.get("message") or lower.get("msg") or lower.get("detail") or lower.get("details") or lower.get("text")
-
-    if not job_col:
-        return 0
-
-    q = f"SELECT * FROM events WHERE {job_col} = ?"
-    rows = cur.execute(q, (job_id,)).fetchall()
-    if not rows:
-        return 0
-
-    desc = [d[0] for d in cur.description]
-    alarms = 0
-    for r in rows:
-        d = {desc[i]: r[i] for i in range(len(desc))}
-        et = str(d.get(type_col) or "").lower() if type_col else ""
-        msg = str(d.get(msg_col) or "").lower() if msg_col else ""
-        if "alarm" in et or "alarm" in msg:
-            alarms += 1
-    return alarms
-
-
-def telemetry_span_seconds(conn: sqlite3.Connection, job_id: int, sample_interval_s_default: float = 1.0) -> float:
-    """Best-effort: compute telemetry span for a job.
-    If timestamps are identical, fall back to (samples-1) * sample_interval_s_default.
-    """
-    cur = conn.cursor()
-    cols = [r[1] for r in cur.execute("PRAGMA table_info(telemetry)").fetchall()]
-    lower = {c.lower(): c for c in cols}
-
-    job_col = lower.get("job_id")
-    ts_col = lower.get("ts_utc") or lower.get("timestamp_utc") or lower.get("timestamp") or lower.get("ts")
-
-    if not job_col or not ts_col:
-        return 0.0
-
-    rows = cur.execute(
-        f"SELECT {ts_col} FROM telemetry WHERE {job_col} = ? ORDER BY {ts_col} ASC",
-        (job_id,),
+        """,
+        params,
     ).fetchall()
 
-    if not rows:
-        return 0.0
-
-    samples = len(rows)
-    first_ts = rows[0][0]
-    last_ts = rows[-1][0]
-
-    span = compute_duration(first_ts, last_ts)
-    if span == 0.0 and samples > 1:
-        span = (samples - 1) * sample_interval_s_default
-    return span
-
 
 def main():
     parser = argparse.ArgumentParser(description="CNC IIoT Daily Summary Report (UTC)")
@@ -165,34 +91,37 @@ def main():
         end_date = today_utc
         start_date = end_date - timedelta(days=days - 1)
 
-    conn = sqlite3.connect(args.db)
+    with managed_conn(args.db, readonly=True) as conn:
+        jobs = fetch_jobs(conn, start_date, end_date)
 
-    jobs_all = fetch_jobs(conn)
-    jobs = filter_jobs_by_date_range(jobs_all, start_date, end_date)
+        status_counts = Counter(str(j["status"] or "").lower() for j in jobs)
+        finished = status_counts["finished"]
+        created = status_counts["created"]
+        started = status_counts["started"]
+        other = len(jobs) - (finished + created + started)
 
-    finished = sum(1 for j in jobs if str(j.get("status") or "").lower() == "finished")
-    created = sum(1 for j in jobs if str(j.get("status") or "").lower() == "created")
-    started = sum(1 for j in jobs if str(j.get("status") or "").lower() == "started")
-    other = len(jobs) - (finished + created + started)
+        total_alarm_events = 0
+        durations = []
 
-    total_alarm_events = 0
-    durations = []
+        # Build a per-job duration using timestamp duration, with telemetry fallback
+        per_job_duration = {}
 
-    # Build a per-job duration using timestamp duration, with telemetry fallback
-    per_job_duration = {}
+        job_ids = [int(j["id"]) for j in jobs]
+        alarm_counts = alarm_counts_by_job(conn, job_ids)
+        tel_spans = telemetry_spans_by_job(conn, job_ids, sample_interval_s_default=1.0)
 
-    for j in jobs:
-        jid = int(j["id"])
-        total_alarm_events += count_alarm_events(conn, jid)
+        for j in jobs:
+            jid = int(j["id"])
+            total_alarm_events += alarm_counts.get(jid, 0)
 
-        dur = compute_duration(j.get("started_ts_utc"), j.get("finished_ts_utc"))
+            dur = compute_duration(j["started_ts_utc"], j["finished_ts_utc"])
 
-        if dur == 0.0:
-            # fallback to telemetry span
-            dur = telemetry_span_seconds(conn, jid, sample_interval_s_default=1.0)
+            if dur == 0.0:
+                # fallback to telemetry span
+                dur = tel_spans.get(jid, 0.0)
 
-        per_job_duration[jid] = dur
-        durations.append(dur)
+            per_job_duration[jid] = dur
+            durations.append(dur)
 
     avg_duration = sum(durations) / len(durations) if durations else 0.0
 
@@ -223,7 +152,7 @@ def main():
             jid = int(j["id"])
             dur = per_job_duration.get(jid, 0.0)
             lines.append(
-                f"  - Job {jid}: {j.get('job_name')} | {j.get('status')} | Dur {human_secs(dur)} | Material {j.get('material') or '-'}"
+                f"  - Job {jid}: {j['job_name']} | {j['status']} | Dur {human_secs(dur)} | Material {j['material'] or '-'}"
             )
 
     report = "\n".join(lines)
@@ -245,7 +174,6 @@ def main():
         print("\n--- Export ---")
         print(f"Report: {path}")
 
-    conn.close()
     print("\nDone ✅")
 
 
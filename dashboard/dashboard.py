@@ -1,15 +1,22 @@
-import sqlite3
+import sys
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+# streamlit only puts dashboard/ on sys.path; the shared DB helper lives in the project root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from cnc_iiot.db import connect_db  # noqa: E402
+from cnc_iiot.summary import alarm_predicate  # noqa: E402
+
 
 # ---------- Setup ----------
 st.set_page_config(page_title="CNC IIoT Dashboard", layout="wide")
 st.title("CNC IIoT Dashboard")
 
 DB_PATH = Path(__file__).resolve().parents[1] / "cnc_iiot.db"
+REFRESH_S = 3
 st.caption(f"DB path: {DB_PATH}")
 
 if not DB_PATH.exists():
@@ -19,24 +26,67 @@ if not DB_PATH.exists():
 # Sidebar controls
 with st.sidebar:
     st.header("Controls")
-    auto_refresh = st.toggle("Auto refresh (3s)", value=True)
+    auto_refresh = st.toggle(f"Auto refresh ({REFRESH_S}s)", value=True)
     show_raw = st.toggle("Show Telemetry + Events", value=False)
 
-# Optional auto refresh
+# Optional auto refresh (live_view below re-runs itself every REFRESH_S seconds)
 if auto_refresh:
     st.caption("🔄 Auto refresh enabled")
-    st.cache_data.clear()
 
 
-@st.cache_data(ttl=3)
+def load_jobs_enriched(conn) -> pd.DataFrame:
+    # One query: jobs + per-job telemetry span/sample count + alarm event count.
+    # Same alarm rule as the reports (is_alarm = 1 -> idx_events_alarm once migrate_schema_v2 ran)
+    alarm_pred = alarm_predicate(conn) or "0"
+    return pd.read_sql_query(
+        f"""
+        SELECT j.id, j.job_name, j.status, j.material, j.notes,
+               j.created_ts_utc, j.started_ts_utc, j.finished_ts_utc,
+               COALESCE(t.sample_count, 0) AS sample_count,
+               t.first_ts, t.last_ts,
+               COALESCE(e.alarm_count, 0) AS alarm_count
+        FROM jobs j
+        LEFT JOIN (
+            SELECT job_id, COUNT(*) AS sample_count, MIN(ts_utc) AS first_ts, MAX(ts_utc) AS last_ts
+            FROM telemetry
+            GROUP BY job_id
+        ) t ON t.job_id = j.id
+        LEFT JOIN (
+            SELECT job_id, COUNT(*) AS alarm_count
+            FROM events
+            WHERE {alarm_pred}
+            GROUP BY job_id
+        ) e ON e.job_id = j.id
+        ORDER BY j.id DESC
+        """,
+        conn,
+    )
+
+
+@st.cache_resource
+def get_conn(db_path: Path):
+    # One long-lived read-only handle per process: SQLite's page cache and mmap survive reruns
+    return connect_db(db_path, readonly=True, check_same_thread=False)
+
+
+@st.cache_data(ttl=REFRESH_S)
 def load_data(db_path: Path):
-    conn = sqlite3.connect(db_path)
-    try:
-        jobs = pd.read_sql_query("SELECT * FROM jobs ORDER BY id DESC", conn)
-        telemetry = pd.read_sql_query("SELECT * FROM telemetry ORDER BY id DESC LIMIT 200", conn)
-        events = pd.read_sql_query("SELECT * FROM events ORDER BY id DESC LIMIT 200", conn)
-    finally:
-        conn.close()
+    conn = get_conn(db_path)
+    jobs = load_jobs_enriched(conn)
+    telemetry = pd.read_sql_query(
+        """
+        SELECT id, ts_utc, state, mpos_x, mpos_y, mpos_z, feed, spindle, job_id
+        FROM telemetry ORDER BY id DESC LIMIT 200
+        """,
+        conn,
+    )
+    events = pd.read_sql_query(
+        """
+        SELECT id, ts_utc, level, category, code, message, job_id
+        FROM events ORDER BY id DESC LIMIT 200
+        """,
+        conn,
+    )
     return jobs, telemetry, events
 
 
@@ -69,99 +119,130 @@ def fmt_duration(sec):
     return f"{m}m {s:02d}s"
 
 
-jobs, telemetry, events = load_data(DB_PATH)
-
-if jobs.empty:
-    st.warning("No jobs found in DB yet.")
-    st.stop()
+def format_durations_series(sec: pd.Series) -> pd.Series:
+    # Vectorised fmt_duration for a whole column (NaN -> "—")
+    valid = sec.notna()
+    total = sec.fillna(0).clip(lower=0).astype("int64").to_numpy()
+    h, rem = np.divmod(total, 3600)
+    m, s = np.divmod(rem, 60)
 
-# ---------- Pick active job ----------
-running = jobs[jobs["status"].astype(str).str.lower() == "running"]
-active_job = running.iloc[0] if not running.empty else jobs.iloc[0]
+    def as_str(a, width=0):
+        out = pd.Series(a, index=sec.index).astype(str)
+        return out.str.zfill(width) if width else out
 
-job_id = int(active_job["id"])
-job_name = str(active_job.get("job_name", ""))
-status = str(active_job.get("status", ""))
-material = str(active_job.get("material", ""))
-notes = str(active_job.get("notes", ""))
+    h_s, m_s, s_s = as_str(h), as_str(m), as_str(s, 2)
+    text = np.where(h > 0, h_s + "h " + as_str(m, 2) + "m " + s_s + "s", m_s + "m " + s_s + "s")
+    return pd.Series(text, index=sec.index).where(valid, "—")
 
-created = to_dt(active_job.get("created_ts_utc"))
-started = to_dt(active_job.get("started_ts_utc"))
-finished = to_dt(active_job.get("finished_ts_utc"))
 
-now_utc = pd.Timestamp.utcnow()
+# ---------- Live view ----------
+# Only this fragment re-runs on the timer (sidebar and setup stay put, nothing blocks);
+# load_data's ttl=REFRESH_S cache decides when SQLite is actually re-read
+@st.fragment(run_every=REFRESH_S if auto_refresh else None)
+def live_view():
+    jobs, telemetry, events = load_data(DB_PATH)
 
-duration_seconds = None
-if pd.notna(started):
-    end_t = finished if pd.notna(finished) else now_utc
-    duration_seconds = (end_t - started).total_seconds()
+    if jobs.empty:
+        st.warning("No jobs found in DB yet.")
+        st.stop()
 
-# ---------- Header summary ----------
-st.success("App is running", icon="✅")
+    # ---------- Pick active job ----------
+    running = jobs[jobs["status"].astype(str).str.lower() == "running"]
+    active_job = running.iloc[0] if not running.empty else jobs.iloc[0]
 
-st.subheader("Overview")
+    job_id = int(active_job["id"])
+    job_name = str(active_job.get("job_name", ""))
+    status = str(active_job.get("status", ""))
+    material = str(active_job.get("material", ""))
+    notes = str(active_job.get("notes", ""))
 
-c1, c2, c3, c4 = st.columns([2.2, 1, 1, 1])
+    started = to_dt(active_job.get("started_ts_utc"))
+    finished = to_dt(active_job.get("finished_ts_utc"))
 
-with c1:
-    # A cleaner "card" using markdown + spacing
-    st.markdown("### Active Job")
-    st.markdown(f"**ID:** `{job_id}`")
-    st.markdown(f"**Name:** {job_name}")
-    st.markdown(f"**Status:** {status_badge(status)}")
-    if material and material != "None":
-        st.markdown(f"**Material:** {material}")
-    if notes and notes != "None":
-        st.markdown(f"**Notes:** {notes}")
+    now_utc = pd.Timestamp.utcnow()
 
-    # Timestamps (compact)
-    ts_line = []
+    duration_seconds = None
     if pd.notna(started):
-        ts_line.append(f"Started: `{started.isoformat()}`")
-    if pd.notna(finished):
-        ts_line.append(f"Finished: `{finished.isoformat()}`")
-    if ts_line:
-        st.caption(" | ".join(ts_line))
-
-with c2:
-    st.metric("Jobs total", len(jobs))
-
-with c3:
-    st.metric("Last job status", status_badge(str(jobs.iloc[0].get("status", ""))))
-
-with c4:
-    st.metric("Active duration", fmt_duration(duration_seconds))
-
-st.divider()
-
-# ---------- Jobs table (polished) ----------
-st.subheader("Jobs")
-
-jobs_view = jobs.copy()
-# Add a pretty status column
-jobs_view["status"] = jobs_view["status"].astype(str).apply(status_badge)
-
-# Reorder columns (nice)
-preferred_cols = ["id", "job_name", "status", "material", "created_ts_utc", "started_ts_utc", "finished_ts_utc", "notes"]
-cols = [c for c in preferred_cols if c in jobs_view.columns] + [c for c in jobs_view.columns if c not in preferred_cols]
-jobs_view = jobs_view[cols]
-
-# Highlight active job row
-def highlight_active(row):
-    return ["background-color: rgba(0, 255, 0, 0.08)"] * len(row) if int(row["id"]) == job_id else [""] * len(row)
-
-st.dataframe(
-    jobs_view.style.apply(highlight_active, axis=1),
-    use_container_width=True,
-    hide_index=True,
-)
-
-# ---------- Optional raw panels ----------
-if show_raw:
-    st.subheader("Details")
-
-    with st.expander("Recent Telemetry (latest 200)", expanded=False):
-        st.dataframe(telemetry, use_container_width=True, hide_index=True)
-
-    with st.expander("Recent Events (latest 200)", expanded=False):
-        st.dataframe(events, use_container_width=True, hide_index=True)
+        end_t = finished if pd.notna(finished) else now_utc
+        duration_seconds = (end_t - started).total_seconds()
+
+    # ---------- Header summary ----------
+    st.success("App is running", icon="✅")
+
+    st.subheader("Overview")
+
+    c1, c2, c3, c4 = st.columns([2.2, 1, 1, 1])
+
+    with c1:
+        # A cleaner "card" using markdown + spacing
+        st.markdown("### Active Job")
+        st.markdown(f"**ID:** `{job_id}`")
+        st.markdown(f"**Name:** {job_name}")
+        st.markdown(f"**Status:** {status_badge(status)}")
+        if material and material != "None":
+            st.markdown(f"**Material:** {material}")
+        if notes and notes != "None":
+            st.markdown(f"**Notes:** {notes}")
+
+        # Timestamps (compact)
+        ts_line = []
+        if pd.notna(started):
+            ts_line.append(f"Started: `{started.isoformat()}`")
+        if pd.notna(finished):
+            ts_line.append(f"Finished: `{finished.isoformat()}`")
+        ts_line.append(f"Samples: `{int(active_job['sample_count'])}`")
+        ts_line.append(f"Alarms: `{int(active_job['alarm_count'])}`")
+        if ts_line:
+            st.caption(" | ".join(ts_line))
+
+    with c2:
+        st.metric("Jobs total", len(jobs))
+
+    with c3:
+        st.metric("Last job status", status_badge(str(jobs.iloc[0].get("status", ""))))
+
+    with c4:
+        st.metric("Active duration", fmt_duration(duration_seconds))
+
+    st.divider()
+
+    # ---------- Jobs table (polished) ----------
+    st.subheader("Jobs")
+
+    jobs_view = jobs.copy()
+    # Add a pretty status column
+    jobs_view["status"] = jobs_view["status"].astype(str).apply(status_badge)
+    # Duration per job (running jobs measured up to now), formatted once for the whole column
+    job_end = to_dt(jobs_view["finished_ts_utc"]).fillna(now_utc)
+    jobs_view["duration"] = format_durations_series((job_end - to_dt(jobs_view["started_ts_utc"])).dt.total_seconds())
+
+    # Flag the active job row (plain column instead of a per-row Styler callback)
+    jobs_view["_active"] = jobs_view["id"] == job_id
+
+    # Reorder columns (nice)
+    preferred_cols = [
+        "_active", "id", "job_name", "status", "duration", "material",
+        "created_ts_utc", "started_ts_utc", "finished_ts_utc", "notes",
+    ]
+    cols = [c for c in preferred_cols if c in jobs_view.columns] + [c for c in jobs_view.columns if c not in preferred_cols]
+    jobs_view = jobs_view[cols]
+
+    st.dataframe(
+        jobs_view,
+        use_container_width=True,
+        hide_index=True,
+        column_config={"_active": st.column_config.CheckboxColumn("Active", disabled=True)},
+    )
+
+    # ---------- Optional raw panels ----------
+    if show_raw:
+        st.subheader("Details")
+
+        with st.expander("Recent Telemetry (latest 200)", expanded=False):
+            st.dataframe(telemetry, use_container_width=True, hide_index=True)
+
+        with st.expander("Recent Events (latest 200)", expanded=False):
+            st.dataframe(events, use_container_width=True, hide_index=True)
+
+
+live_view()
@@ -1,62 +1,79 @@
+# export_job_report.py
+# Usage:
+#   python export_job_report.py                  # job 1
+#   python export_job_report.py --job-ids 1 2 3
+#   python export_job_report.py --all
+#   python export_job_report.py --all --db "C:\path\to\cnc_iiot.db"
+
+import argparse
 import csv
-import sqlite3
 from pathlib import Path
+from typing import List, Optional, Tuple
+
+from cnc_iiot.db import managed_conn
+from cnc_iiot.summary import TELEMETRY_STATS_SQL
 
 DB = "cnc_iiot.db"
 JOB_ID = 1
 
 OUT_DIR = Path("reports")
-OUT_DIR.mkdir(exist_ok=True)
-
-summary_csv = OUT_DIR / f"job_{JOB_ID}_summary.csv"
-events_csv = OUT_DIR / f"job_{JOB_ID}_events.csv"
-telemetry_csv = OUT_DIR / f"job_{JOB_ID}_telemetry.csv"
-
-
-def main():
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-
-    job = cur.execute("""
-        SELECT id, job_name, status, created_ts_utc, started_ts_utc, finished_ts_utc, material, notes
-        FROM jobs
-        WHERE id=?
-    """, (JOB_ID,)).fetchone()
 
+# SQL text is identical for every job, so sqlite3's statement cache reuses the prepared statements
+JOB_SQL = """
+    SELECT id, job_name, status, created_ts_utc, started_ts_utc, finished_ts_utc, material, notes
+    FROM jobs
+    WHERE id=?
+"""
+
+EVENT_COUNT_SQL = "SELECT COUNT(*) FROM events WHERE job_id=?"
+
+ALARM_COUNT_SQL = """
+    SELECT COUNT(*)
+    FROM events
+    WHERE job_id=? AND (category='grbl' OR event_type='alarm' OR message LIKE 'ALARM:%')
+"""
+
+EVENTS_SQL = """
+    SELECT id, ts_utc, level, category, code, message, job_id
+    FROM events
+    WHERE job_id=?
+    ORDER BY id ASC
+"""
+
+TELEMETRY_SQL = """
+    SELECT id, ts_utc, state, mpos_x, mpos_y, mpos_z, feed, spindle, job_id
+    FROM telemetry
+    WHERE job_id=?
+    ORDER BY id ASC
+"""
+
+
+def export_job(cur, job_id: int) -> Optional[Tuple[Path, Path, Path]]:
+    """Write summary/events/telemetry CSVs for one job. Returns the paths, or None if the job doesn't exist."""
+    job = cur.execute(JOB_SQL, (job_id,)).fetchone()
     if not job:
-        print("❌ No job found with id:", JOB_ID)
-        return
+        print("❌ No job found with id:", job_id)
+        return None
+
+    summary_csv = OUT_DIR / f"job_{job_id}_summary.csv"
+    events_csv = OUT_DIR / f"job_{job_id}_events.csv"
+    telemetry_csv = OUT_DIR / f"job_{job_id}_telemetry.csv"
 
     # --- Summary metrics ---
-    tel_count = cur.execute("SELECT COUNT(*) FROM telemetry WHERE job_id=?", (JOB_ID,)).fetchone()[0]
-    ev_count = cur.execute("SELECT COUNT(*) FROM events WHERE job_id=?", (JOB_ID,)).fetchone()[0]
-    alarms = cur.execute("""
-        SELECT COUNT(*)
-        FROM events
-        WHERE job_id=? AND (category='grbl' OR event_type='alarm' OR message LIKE 'ALARM:%')
-    """, (JOB_ID,)).fetchone()[0]
-
-    t0, t1 = cur.execute("""
-        SELECT MIN(ts_utc), MAX(ts_utc)
-        FROM telemetry
-        WHERE job_id=?
-    """, (JOB_ID,)).fetchone()
-
-    state_counts = cur.execute("""
-        SELECT state, COUNT(*)
-        FROM telemetry
-        WHERE job_id=?
-        GROUP BY state
-        ORDER BY COUNT(*) DESC
-    """, (JOB_ID,)).fetchall()
+    ev_count = cur.execute(EVENT_COUNT_SQL, (job_id,)).fetchone()[0]
+    alarms = cur.execute(ALARM_COUNT_SQL, (job_id,)).fetchone()[0]
+
+    tel_rows = cur.execute(TELEMETRY_STATS_SQL, (job_id,)).fetchall()
+    state_counts = [(state, c) for state, c, _, _, _ in tel_rows]
+    tel_count, t0, t1 = tel_rows[0][2:] if tel_rows else (0, None, None)
 
     # write summary CSV (key/value style)
     with summary_csv.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["key", "value"])
 
-        (job_id, name, status, created, started, finished, material, notes) = job
-        w.writerow(["job_id", job_id])
+        (jid, name, status, created, started, finished, material, notes) = job
+        w.writerow(["job_id", jid])
         w.writerow(["job_name", name])
         w.writerow(["status", status])
         w.writerow(["material", material])
@@ -78,32 +95,48 @@ def main():
     with events_csv.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["id", "ts_utc", "level", "category", "code", "message", "job_id"])
-        for r in cur.execute("""
-            SELECT id, ts_utc, level, category, code, message, job_id
-            FROM events
-            WHERE job_id=?
-            ORDER BY id ASC
-        """, (JOB_ID,)):
-            w.writerow(r)
+        cur.execute(EVENTS_SQL, (job_id,))
+        while batch := cur.fetchmany():
+            w.writerows(batch)
 
     # --- Telemetry CSV (latest N, or all if you want) ---
     with telemetry_csv.open("w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["id", "ts_utc", "state", "mpos_x", "mpos_y", "mpos_z", "feed", "spindle", "job_id"])
-        for r in cur.execute("""
-            SELECT id, ts_utc, state, mpos_x, mpos_y, mpos_z, feed, spindle, job_id
-            FROM telemetry
-            WHERE job_id=?
-            ORDER BY id ASC
-        """, (JOB_ID,)):
-            w.writerow(r)
-
-    conn.close()
-
-    print("✅ Exported:")
-    print(" -", summary_csv.resolve())
-    print(" -", events_csv.resolve())
-    print(" -", telemetry_csv.resolve())
+        cur.execute(TELEMETRY_SQL, (job_id,))
+        while batch := cur.fetchmany():
+            w.writerows(batch)
+
+    return summary_csv, events_csv, telemetry_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CNC IIoT Job Report CSV Export")
+    parser.add_argument("--job-ids", type=int, nargs="+", default=[JOB_ID], help="Job IDs to export (default: 1)")
+    parser.add_argument("--all", action="store_true", help="Export every job in the DB")
+    parser.add_argument("--db", default=DB, help="Path to SQLite DB (default: cnc_iiot.db)")
+    args = parser.parse_args()
+
+    OUT_DIR.mkdir(exist_ok=True)
+
+    exported: List[Tuple[Path, Path, Path]] = []
+    with managed_conn(args.db, readonly=True) as conn, conn:
+        # one read transaction -> every query below sees the same snapshot
+        conn.execute("BEGIN")
+        cur = conn.cursor()
+        cur.arraysize = 1000
+
+        job_ids = [r[0] for r in cur.execute("SELECT id FROM jobs ORDER BY id ASC")] if args.all else args.job_ids
+        for job_id in job_ids:
+            paths = export_job(cur, job_id)
+            if paths:
+                exported.append(paths)
+
+    if exported:
+        print("✅ Exported:")
+        for paths in exported:
+            for p in paths:
+                print(" -", p.resolve())
 
 
 if __name__ == "__main__":
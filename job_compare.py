@@ -9,24 +9,41 @@
 
 import argparse
 import csv
-import json
 import os
 import sqlite3
-from datetime import datetime
+import sys
+from collections import namedtuple
+from itertools import groupby
+from operator import itemgetter
 from typing import Dict, List, Optional, Tuple, Any
 
+from cnc_iiot.columns import (
+    add_numeric, fetch_rows, get_column_types, get_table_columns, has_numeric_affinity, pick_first, quote_ident,
+    select_list,
+)
+from cnc_iiot.db import connect_db
+from cnc_iiot.export import write_json
+from cnc_iiot.timeutil import compute_duration
+
 
 DB_PATH_DEFAULT = "cnc_iiot.db"
 
+# fetchmany() batch size for the streamed telemetry fallback
+STREAM_BATCH = 10_000
+
+# Detected column names (None if missing); same for every job, so detect once per run
+TelSchema = namedtuple("TelSchema", "cols ts job state feed power numeric")
+EvtSchema = namedtuple("EvtSchema", "cols job ts type msg")
 
-def iso_to_dt(s: Optional[str]) -> Optional[datetime]:
-    if not s:
-        return None
-    s2 = s.replace("Z", "+00:00")
-    try:
-        return datetime.fromisoformat(s2)
-    except ValueError:
-        return None
+JOBS_SQL = """
+    SELECT id, job_name, status, material, notes,
+           created_ts_utc, started_ts_utc, finished_ts_utc
+    FROM jobs
+    ORDER BY id ASC
+"""
+
+# Per-job telemetry aggregate, in telemetry_kpi_sql() column order
+TEL_STAT_KEYS = ("samples", "first_ts", "last_ts", "feed_avg", "feed_max", "power_avg", "power_max", "alarm", "idle")
 
 
 def safe_div(a: float, b: float) -> float:
@@ -47,48 +64,46 @@ def human_secs(seconds: float) -> str:
     return f"{sec}s"
 
 
-def compute_duration(start_iso: Optional[str], end_iso: Optional[str]) -> float:
-    sdt = iso_to_dt(start_iso)
-    edt = iso_to_dt(end_iso)
-    if not sdt or not edt:
-        return 0.0
-    return max(0.0, (edt - sdt).total_seconds())
-
-
-def get_table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
-    cur = conn.cursor()
-    rows = cur.execute(f"PRAGMA table_info({table})").fetchall()
-    return [r[1] for r in rows]
-
-
-def pick_first(cols: List[str], candidates: List[str]) -> Optional[str]:
-    lower = {c.lower(): c for c in cols}
-    for cand in candidates:
-        if cand.lower() in lower:
-            return lower[cand.lower()]
-    return None
-
+def telemetry_kpi_sql(
+    ts_col: str, job_col: str, state_col: Optional[str], feed_col: Optional[str], power_col: Optional[str]
+) -> str:
+    """
+    One aggregate row per job: job_id + TEL_STAT_KEYS.
+    feed/power only count real numbers (non-numeric text is skipped); pass None to skip a column.
+    """
+    def num(col: Optional[str]) -> str:
+        if not col:
+            return "NULL"
+        c = quote_ident(col)
+        return f"CASE WHEN typeof({c}) IN ('integer', 'real') THEN {c} END"
+
+    if state_col:
+        s = f"LOWER(COALESCE({quote_ident(state_col)}, ''))"
+        alarm = f"COALESCE(SUM(instr({s}, 'alarm') > 0), 0)"
+        idle = f"COALESCE(SUM(instr({s}, 'alarm') = 0 AND instr({s}, 'idle') > 0), 0)"
+    else:
+        alarm = idle = "0"
 
-def fetchall_dicts(cur: sqlite3.Cursor, query: str, params: Tuple[Any, ...] = ()) -> List[Dict[str, Any]]:
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    if not rows:
-        return []
-    colnames = [d[0] for d in cur.description]
-    return [{colnames[i]: r[i] for i in range(len(colnames))} for r in rows]
+    ts = quote_ident(ts_col)
+    job = quote_ident(job_col)
+    return f"""
+        SELECT {job}, COUNT(*), MIN({ts}), MAX({ts}),
+               AVG({num(feed_col)}), CAST(MAX({num(feed_col)}) AS REAL),
+               AVG({num(power_col)}), CAST(MAX({num(power_col)}) AS REAL),
+               {alarm}, {idle}
+        FROM telemetry
+        GROUP BY {job}
+    """
 
 
 def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
-def export_csv(path: str, rows: List[Dict[str, Any]]) -> None:
-    if not rows:
-        return
-    fieldnames = list(rows[0].keys())
+def export_csv(path: str, cols: List[str], rows: List[Tuple[Any, ...]]) -> None:
     with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
+        w = csv.writer(f)
+        w.writerow(cols)
         w.writerows(rows)
 
 
@@ -100,23 +115,92 @@ def efficiency_score_v2(idle_pct: float, alarm_pct: float) -> float:
     return max(0.0, min(100.0, score))
 
 
-def compute_job_kpis(conn: sqlite3.Connection, job: Dict[str, Any], sample_interval_s_default: float = 1.0) -> Dict[str, Any]:
-    cur = conn.cursor()
+def detect_tel_schema(conn: sqlite3.Connection) -> TelSchema:
+    cols = get_table_columns(conn, "telemetry")
+    types = get_column_types(conn, "telemetry")
+    return TelSchema(
+        cols=cols,
+        ts=pick_first(cols, ["ts_utc", "timestamp_utc", "timestamp", "ts"]),
+        job=pick_first(cols, ["job_id"]),
+        state=pick_first(cols, ["state", "machine_state", "status"]),
+        feed=pick_first(cols, ["feed", "feed_rate", "f"]),
+        power=pick_first(cols, ["laser_power", "power", "s", "s_value", "spindle", "spindle_speed", "rpm", "pwm"]),
+        numeric=frozenset(c for c in cols if has_numeric_affinity(types[c])),
+    )
 
+
+def detect_evt_schema(conn: sqlite3.Connection) -> EvtSchema:
+    cols = get_table_columns(conn, "events")
+    return EvtSchema(
+        cols=cols,
+        job=pick_first(cols, ["job_id"]),
+        ts=pick_first(cols, ["ts_utc", "timestamp_utc", "timestamp", "ts"]),
+        type=pick_first(cols, ["event_type", "type", "level", "category"]),
+        msg=pick_first(cols, ["message", "msg", "detail", "details", "text"]),
+    )
+
+
+def telemetry_stats_by_job(cur: sqlite3.Cursor, tel: TelSchema) -> Dict[Any, Dict[str, Any]]:
+    """job_id -> TEL_STAT_KEYS dict, for every job with telemetry (one GROUP BY pass)."""
+    if not (tel.ts and tel.job):
+        return {}
+
+    # Aggregate in SQLite. Columns without numeric affinity may hold numbers as text,
+    # which only float() understands, so those are converted with NumPy below.
+    sql_num = {c: c if c in tel.numeric else None for c in (tel.feed, tel.power)}
+    stats = {
+        r[0]: dict(zip(TEL_STAT_KEYS, r[1:]))
+        for r in cur.execute(telemetry_kpi_sql(tel.ts, tel.job, tel.state, sql_num[tel.feed], sql_num[tel.power]))
+    }
+
+    text_cols = [c for c in (tel.feed, tel.power) if c and not sql_num[c]]
+    if text_cols and stats:
+        cur.execute(
+            f"SELECT {select_list([tel.job] + text_cols, tel.cols)} FROM telemetry ORDER BY {quote_ident(tel.job)}"
+        )
+        # streamed column-wise: running [sum, count, max] per (job, column)
+        acc: Dict[Any, List[List[Any]]] = {}
+        while rows := cur.fetchmany(STREAM_BATCH):
+            for job_id, grp in groupby(rows, key=itemgetter(0)):
+                job_acc = acc.setdefault(job_id, [[0.0, 0, None] for _ in text_cols])
+                for a, values in zip(job_acc, list(zip(*grp))[1:]):
+                    add_numeric(a, values)
+
+        for job_id, job_acc in acc.items():
+            for col, (total, n, vmax) in zip(text_cols, job_acc):
+                if n and job_id in stats:
+                    name = "feed" if col == tel.feed else "power"
+                    stats[job_id][f"{name}_avg"] = total / n
+                    stats[job_id][f"{name}_max"] = vmax
+
+    return stats
+
+
+def event_stats_by_job(cur: sqlite3.Cursor, evt: EvtSchema) -> Dict[Any, Tuple[int, int]]:
+    """job_id -> (event_count, alarm_events); alarm = 'alarm' in type or message."""
+    if not (evt.job and evt.ts):
+        return {}
+
+    preds = [f"instr(LOWER(COALESCE({quote_ident(c)}, '')), 'alarm') > 0" for c in (evt.type, evt.msg) if c]
+    alarm = f"COALESCE(SUM({' OR '.join(preds)}), 0)" if preds else "0"
+    job = quote_ident(evt.job)
+    q = f"SELECT {job}, COUNT(*), {alarm} FROM events GROUP BY {job}"
+    return {r[0]: (r[1], r[2]) for r in cur.execute(q)}
+
+
+def compute_job_kpis(
+    job: Dict[str, Any],
+    tel: TelSchema,
+    tel_stats: Optional[Dict[str, Any]],
+    evt_stats: Optional[Tuple[int, int]],
+    sample_interval_s_default: float = 1.0,
+) -> Dict[str, Any]:
     job_id = int(job["id"])
     started = job.get("started_ts_utc")
     finished = job.get("finished_ts_utc")
     duration_total = compute_duration(started, finished)
 
-    # Telemetry column detection
-    tel_cols = get_table_columns(conn, "telemetry")
-    ts_col = pick_first(tel_cols, ["ts_utc", "timestamp_utc", "timestamp", "ts"])
-    job_col = pick_first(tel_cols, ["job_id"])
-    state_col = pick_first(tel_cols, ["state", "machine_state", "status"])
-    feed_col = pick_first(tel_cols, ["feed", "feed_rate", "f"])
-    power_col = pick_first(tel_cols, ["laser_power", "power", "s", "s_value", "spindle", "spindle_speed", "rpm", "pwm"])
-
-    telemetry_rows: List[Dict[str, Any]] = []
+    samples = 0
     tel_span = 0.0
 
     feed_avg = feed_max = None
@@ -126,56 +210,19 @@ def compute_job_kpis(conn: sqlite3.Connection, job: Dict[str, Any], sample_inter
     active_pct = idle_pct = alarm_pct = 0.0
     eff_score = None
 
-    if ts_col and job_col:
-        telemetry_rows = fetchall_dicts(
-            cur,
-            f"SELECT * FROM telemetry WHERE {job_col} = ? ORDER BY {ts_col} ASC",
-            (job_id,),
-        )
-
-    if telemetry_rows:
-        first_ts = telemetry_rows[0].get(ts_col)
-        last_ts = telemetry_rows[-1].get(ts_col)
-        samples = len(telemetry_rows)
+    if tel_stats:
+        samples = tel_stats["samples"]
+        feed_avg, feed_max = tel_stats["feed_avg"], tel_stats["feed_max"]
+        power_avg, power_max = tel_stats["power_avg"], tel_stats["power_max"]
 
-        tel_span = compute_duration(first_ts, last_ts)
+        tel_span = compute_duration(tel_stats["first_ts"], tel_stats["last_ts"])
         if tel_span == 0.0 and samples > 1:
             tel_span = (samples - 1) * sample_interval_s_default
 
-        def extract_numeric(colname: Optional[str]) -> List[float]:
-            if not colname:
-                return []
-            vals = []
-            for r in telemetry_rows:
-                v = r.get(colname)
-                try:
-                    if v is None:
-                        continue
-                    vals.append(float(v))
-                except (ValueError, TypeError):
-                    continue
-            return vals
-
-        feed_vals = extract_numeric(feed_col)
-        power_vals = extract_numeric(power_col)
-
-        if feed_vals:
-            feed_avg = sum(feed_vals) / len(feed_vals)
-            feed_max = max(feed_vals)
-
-        if power_vals:
-            power_avg = sum(power_vals) / len(power_vals)
-            power_max = max(power_vals)
-
-        if state_col:
-            for r in telemetry_rows:
-                s = str(r.get(state_col) or "").lower()
-                if "alarm" in s:
-                    alarm += 1
-                elif "idle" in s:
-                    idle += 1
-                else:
-                    active += 1
+        if tel.state:
+            alarm = tel_stats["alarm"]
+            idle = tel_stats["idle"]
+            active = samples - alarm - idle
 
             total = active + idle + alarm
             active_pct = 100.0 * safe_div(active, total)
@@ -189,27 +236,7 @@ def compute_job_kpis(conn: sqlite3.Connection, job: Dict[str, Any], sample_inter
         duration_total = tel_span
 
     # Events alarm count + alarm rate per minute
-    evt_cols = get_table_columns(conn, "events")
-    evt_job_col = pick_first(evt_cols, ["job_id"])
-    evt_ts_col = pick_first(evt_cols, ["ts_utc", "timestamp_utc", "timestamp", "ts"])
-    evt_type_col = pick_first(evt_cols, ["event_type", "type", "level", "category"])
-    evt_msg_col = pick_first(evt_cols, ["message", "msg", "detail", "details", "text"])
-
-    alarm_events = 0
-    event_count = 0
-
-    if evt_job_col and evt_ts_col:
-        events = fetchall_dicts(
-            cur,
-            f"SELECT * FROM events WHERE {evt_job_col} = ? ORDER BY {evt_ts_col} ASC",
-            (job_id,),
-        )
-        event_count = len(events)
-        for e in events:
-            et = str(e.get(evt_type_col) or "").lower() if evt_type_col else ""
-            msg = str(e.get(evt_msg_col) or "").lower() if evt_msg_col else ""
-            if "alarm" in et or "alarm" in msg:
-                alarm_events += 1
+    event_count, alarm_events = evt_stats or (0, 0)
 
     duration_min = duration_total / 60.0 if duration_total else 0.0
     alarm_rate_per_min = (alarm_events / duration_min) if duration_min else 0.0
@@ -226,7 +253,7 @@ def compute_job_kpis(conn: sqlite3.Connection, job: Dict[str, Any], sample_inter
         "duration_seconds": duration_total,
         "duration_human": human_secs(duration_total),
 
-        "telemetry_samples": len(telemetry_rows),
+        "telemetry_samples": samples,
         "telemetry_span_seconds": tel_span,
         "telemetry_span_human": human_secs(tel_span),
 
@@ -235,13 +262,13 @@ def compute_job_kpis(conn: sqlite3.Connection, job: Dict[str, Any], sample_inter
         "power_avg": power_avg,
         "power_max": power_max,
 
-        "active_samples": active if telemetry_rows else None,
-        "idle_samples": idle if telemetry_rows else None,
-        "alarm_samples": alarm if telemetry_rows else None,
+        "active_samples": active if samples else None,
+        "idle_samples": idle if samples else None,
+        "alarm_samples": alarm if samples else None,
 
-        "active_pct": active_pct if telemetry_rows else None,
-        "idle_pct": idle_pct if telemetry_rows else None,
-        "alarm_pct": alarm_pct if telemetry_rows else None,
+        "active_pct": active_pct if samples else None,
+        "idle_pct": idle_pct if samples else None,
+        "alarm_pct": alarm_pct if samples else None,
 
         "efficiency_score_v2": eff_score,
 
@@ -277,23 +304,17 @@ def print_table(rows: List[Dict[str, Any]]) -> None:
             return f"{v:.1f}"
         return str(v)
 
-    # compute widths
-    widths = []
-    for key, title in headers:
-        maxw = len(title)
-        for r in rows:
-            maxw = max(maxw, len(fmt(r.get(key))))
-        widths.append(maxw)
+    # format every cell once, then size columns from the strings
+    cells = [[fmt(r.get(key)) for key, _ in headers] for r in rows]
+    widths = [max([len(title)] + [len(c[i]) for c in cells]) for i, (_, title) in enumerate(headers)]
 
     # print header
     line = " | ".join(title.ljust(widths[i]) for i, (_, title) in enumerate(headers))
     print("\n" + line)
     print("-" * len(line))
 
-    # print rows sorted by ID
-    for r in sorted(rows, key=lambda x: x["job_id"]):
-        rowline = " | ".join(fmt(r.get(key)).ljust(widths[i]) for i, (key, _) in enumerate(headers))
-        print(rowline)
+    # rows arrive in job id order (jobs query is ORDER BY id); one write for the whole table body
+    sys.stdout.write("".join(" | ".join(c.ljust(w) for c, w in zip(row, widths)) + "\n" for row in cells))
 
     # quick insights
     print("\nInsights:")
@@ -301,11 +322,11 @@ def print_table(rows: List[Dict[str, Any]]) -> None:
         r = rows[0]
         print(f"- Only 1 job in DB right now (Job {r['job_id']}). Add more jobs to see comparisons.")
     else:
-        ranked = sorted([r for r in rows if r.get("efficiency_score_v2") is not None],
-                        key=lambda x: x["efficiency_score_v2"], reverse=True)
-        if ranked:
-            best = ranked[0]
-            worst = ranked[-1]
+        scored = [r for r in rows if r.get("efficiency_score_v2") is not None]
+        if scored:
+            best = max(scored, key=lambda x: x["efficiency_score_v2"])
+            # reversed: on ties keep the last job, as the old sorted(...)[-1] did
+            worst = min(reversed(scored), key=lambda x: x["efficiency_score_v2"])
             print(f"- Best efficiency: Job {best['job_id']} ({best['efficiency_score_v2']:.1f}/100)")
             print(f"- Worst efficiency: Job {worst['job_id']} ({worst['efficiency_score_v2']:.1f}/100)")
 
@@ -316,22 +337,22 @@ def main():
     parser.add_argument("--export", action="store_true", help="Export summary files to ./exports")
     args = parser.parse_args()
 
-    conn = sqlite3.connect(args.db)
+    conn = connect_db(args.db, readonly=True)
     cur = conn.cursor()
 
-    jobs = fetchall_dicts(
-        cur,
-        """
-        SELECT id, job_name, status, material, notes,
-               created_ts_utc, started_ts_utc, finished_ts_utc
-        FROM jobs
-        ORDER BY id ASC
-        """
-    )
+    job_fields, job_rows = fetch_rows(cur, JOBS_SQL)
+    # one dict per job (not per sample) - compute_job_kpis reads fields by name
+    jobs = [dict(zip(job_fields, r)) for r in job_rows]
+
+    tel = detect_tel_schema(conn)
+    evt = detect_evt_schema(conn)
+
+    tel_stats = telemetry_stats_by_job(cur, tel)
+    evt_stats = event_stats_by_job(cur, evt)
 
     summary_rows: List[Dict[str, Any]] = []
     for j in jobs:
-        summary_rows.append(compute_job_kpis(conn, j))
+        summary_rows.append(compute_job_kpis(j, tel, tel_stats.get(j["id"]), evt_stats.get(j["id"])))
 
     print_table(summary_rows)
 
@@ -342,9 +363,10 @@ def main():
         csv_path = os.path.join(outdir, "jobs_summary.csv")
         json_path = os.path.join(outdir, "jobs_summary.json")
 
-        export_csv(csv_path, summary_rows)
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(summary_rows, f, indent=2)
+        if summary_rows:
+            # every row dict is built by compute_job_kpis, so the key order is the same
+            export_csv(csv_path, list(summary_rows[0]), [tuple(r.values()) for r in summary_rows])
+        write_json(json_path, summary_rows)
 
         print("\n--- Export ---")
         print(f"CSV  : {csv_path}")
@@ -1,41 +1,74 @@
-import sqlite3
 from datetime import datetime, timezone
 
+from cnc_iiot.db import get_writer
+
 DB = "cnc_iiot.db"
 
+_conn = None
+_cur = None
+
+def get_conn():
+    # the pool's shared writer: opened on first use, closed at exit (WAL + PRAGMAs via connect_db)
+    global _conn, _cur
+    if _conn is None:
+        _conn = get_writer(DB)
+        _cur = _conn.cursor()
+    return _conn
+
+def get_cursor():
+    # one cursor on the shared connection; the SQL text below never changes,
+    # so sqlite3's statement cache keeps the prepared statements
+    get_conn()
+    return _cur
+
 def now_utc():
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
-def log_event(
-    cur,
-    level,
-    category,
-    message,
-    code=None,
-    job_id=None,
-    meta_json=None,
-    raw=None
-):
+EVENT_INSERT_SQL = """
+    INSERT INTO events (
+        ts,
+        ts_utc,
+        event_type,
+        message,
+        raw,
+        level,
+        category,
+        code,
+        job_id,
+        meta_json
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+JOB_INSERT_SQL = """
+    INSERT INTO jobs (
+        job_name,
+        created_ts_utc,
+        status,
+        material,
+        notes
+    )
+    VALUES (?, ?, 'created', ?, ?)
+"""
+
+JOB_START_SQL = """
+    UPDATE jobs
+    SET started_ts_utc = ?, status = 'running'
+    WHERE id = ? AND status IN ('created','paused')
+"""
+
+JOB_STOP_SQL = """
+    UPDATE jobs
+    SET finished_ts_utc = ?, status = ?
+    WHERE id = ? AND status IN ('running','paused')
+"""
+
+def _event_params(ts, level, category, message, code, job_id, meta_json, raw):
     # events.raw is NOT NULL in your original schema
     raw = raw if raw is not None else ""
-
-    cur.execute("""
-        INSERT INTO events (
-            ts,
-            ts_utc,
-            event_type,
-            message,
-            raw,
-            level,
-            category,
-            code,
-            job_id,
-            meta_json
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        now_utc(),          # ts
-        now_utc(),          # ts_utc
+    return (
+        ts,                 # ts
+        ts,                 # ts_utc
         category,           # event_type (legacy)
         message,
         raw,
@@ -44,78 +77,83 @@ def log_event(
         code,
         job_id,
         meta_json
-    ))
+    )
 
-def create_job(job_name, material=None, notes=None):
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO jobs (
-            job_name,
-            created_ts_utc,
-            status,
-            material,
-            notes
-        )
-        VALUES (?, ?, 'created', ?, ?)
-    """, (job_name, now_utc(), material, notes))
+def log_event(
+    cur,
+    level,
+    category,
+    message,
+    code=None,
+    job_id=None,
+    meta_json=None,
+    raw=None,
+    ts=None
+):
+    ts = ts if ts is not None else now_utc()
+    cur.execute(EVENT_INSERT_SQL, _event_params(ts, level, category, message, code, job_id, meta_json, raw))
 
-    job_id = cur.lastrowid
+def log_events_many(cur, events, ts=None):
+    # events: iterable of (level, category, message, code, job_id, meta_json, raw)
+    # one timestamp + one executemany for the whole batch
+    ts = ts if ts is not None else now_utc()
+    cur.executemany(EVENT_INSERT_SQL, (_event_params(ts, *e) for e in events))
 
-    log_event(
-        cur,
-        level="info",
-        category="job",
-        message=f"Job created: {job_name}",
-        job_id=job_id
-    )
+def create_job(job_name, material=None, notes=None):
+    conn = get_conn()
+    cur = get_cursor()
+    ts = now_utc()
+
+    # job row + its event commit together
+    with conn:
+        cur.execute(JOB_INSERT_SQL, (job_name, ts, material, notes))
+
+        job_id = cur.lastrowid
+
+        log_event(
+            cur,
+            level="info",
+            category="job",
+            message=f"Job created: {job_name}",
+            job_id=job_id,
+            ts=ts
+        )
 
-    conn.commit()
-    conn.close()
     return job_id
 
 def start_job(job_id):
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-
-    cur.execute("""
-        UPDATE jobs
-        SET started_ts_utc = ?, status = 'running'
-        WHERE id = ? AND status IN ('created','paused')
-    """, (now_utc(), job_id))
-
-    log_event(
-        cur,
-        level="info",
-        category="job",
-        message="Job started",
-        job_id=job_id
-    )
-
-    conn.commit()
-    conn.close()
+    conn = get_conn()
+    cur = get_cursor()
+    ts = now_utc()
+
+    with conn:
+        cur.execute(JOB_START_SQL, (ts, job_id))
+
+        log_event(
+            cur,
+            level="info",
+            category="job",
+            message="Job started",
+            job_id=job_id,
+            ts=ts
+        )
 
 def stop_job(job_id, status="finished"):
-    conn = sqlite3.connect(DB)
-    cur = conn.cursor()
-
-    cur.execute("""
-        UPDATE jobs
-        SET finished_ts_utc = ?, status = ?
-        WHERE id = ? AND status IN ('running','paused')
-    """, (now_utc(), status, job_id))
-
-    log_event(
-        cur,
-        level="info",
-        category="job",
-        message=f"Job ended: {status}",
-        job_id=job_id
-    )
-
-    conn.commit()
-    conn.close()
+    conn = get_conn()
+    cur = get_cursor()
+    ts = now_utc()
+
+    with conn:
+        cur.execute(JOB_STOP_SQL, (ts, status, job_id))
+
+        log_event(
+            cur,
+            level="info",
+            category="job",
+            message=f"Job ended: {status}",
+            job_id=job_id,
+            ts=ts
+        )
 
 # -------------------------------------------------
 # Demo run (safe to run multiple times)
@@ -8,42 +8,86 @@
 
 import argparse
 import csv
-import json
 import os
 import sqlite3
-from datetime import datetime
+import sys
 from typing import Dict, List, Optional, Tuple, Any
 
+from cnc_iiot.columns import (
+    add_numeric, fetch_rows, get_column_types, get_table_columns, has_numeric_affinity, pick_first, quote_ident,
+    select_list,
+)
+from cnc_iiot.db import connect_db
+from cnc_iiot.export import write_json
+from cnc_iiot.timeutil import compute_duration
+
 
 DB_PATH_DEFAULT = "cnc_iiot.db"
 
+LATEST_JOB_SQL = "SELECT id FROM jobs ORDER BY id DESC LIMIT 1"
 
-def iso_to_dt(s: Optional[str]) -> Optional[datetime]:
-    if not s:
-        return None
-    s2 = s.replace("Z", "+00:00")
-    try:
-        return datetime.fromisoformat(s2)
-    except ValueError:
-        return None
+JOB_SQL = """
+    SELECT id, job_name, status, material, notes,
+           created_ts_utc, started_ts_utc, finished_ts_utc
+    FROM jobs
+    WHERE id = ?
+"""
 
+# fetchmany() batch size for the streamed telemetry fallback
+STREAM_BATCH = 10_000
 
-def safe_div(a: float, b: float) -> float:
-    return a / b if b else 0.0
 
+# KPI buckets for telemetry states
+ACTIVE, IDLE, ALARM = 0, 1, 2
 
-def get_table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
-    cur = conn.cursor()
-    rows = cur.execute(f"PRAGMA table_info({table})").fetchall()
-    return [r[1] for r in rows]
 
+def state_code(state: Any) -> int:
+    """Alarm wins over idle; everything else counts as active."""
+    s = str(state or "").lower()
+    if "alarm" in s:
+        return ALARM
+    if "idle" in s:
+        return IDLE
+    return ACTIVE
 
-def pick_first(cols: List[str], candidates: List[str]) -> Optional[str]:
-    lower = {c.lower(): c for c in cols}
-    for cand in candidates:
-        if cand.lower() in lower:
-            return lower[cand.lower()]
-    return None
+
+def safe_div(a: float, b: float) -> float:
+    return a / b if b else 0.0
+
+
+def telemetry_state_sql(
+    ts_col: str, job_col: str, state_col: Optional[str], feed_col: Optional[str], power_col: Optional[str]
+) -> str:
+    """
+    One pass over a job's telemetry, one row per state (a single row without a state column):
+    state, samples, first_ts, last_ts, feed_sum, feed_n, feed_max, power_sum, power_n, power_max.
+    feed/power only count real numbers (non-numeric text is skipped); pass None to skip a column.
+    """
+    def num(col: Optional[str]) -> str:
+        if not col:
+            return "NULL"
+        c = quote_ident(col)
+        return f"CASE WHEN typeof({c}) IN ('integer', 'real') THEN {c} END"
+
+    ts = quote_ident(ts_col)
+    feed = num(feed_col)
+    power = num(power_col)
+    return f"""
+        SELECT {quote_ident(state_col) if state_col else "NULL"}, COUNT(*), MIN({ts}), MAX({ts}),
+               TOTAL({feed}), COUNT({feed}), MAX({feed}),
+               TOTAL({power}), COUNT({power}), MAX({power})
+        FROM telemetry
+        WHERE {quote_ident(job_col)} = ?
+        GROUP BY 1
+    """
+
+
+def combine_numeric(groups: List[Tuple[Any, ...]], i: int) -> Tuple[Optional[float], Optional[float]]:
+    """avg/max over all groups from the per-group (sum, count, max) columns starting at index i."""
+    n = sum(g[i + 1] for g in groups)
+    if not n:
+        return None, None
+    return sum(g[i] for g in groups) / n, float(max(g[i + 2] for g in groups if g[i + 2] is not None))
 
 
 def fetchone_dict(cur: sqlite3.Cursor, query: str, params: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
@@ -54,15 +98,6 @@ def fetchone_dict(cur: sqlite3.Cursor, query: str, params: Tuple[Any, ...]) -> O
     return {desc[0]: row[i] for i, desc in enumerate(cur.description)}
 
 
-def fetchall_dicts(cur: sqlite3.Cursor, query: str, params: Tuple[Any, ...]) -> List[Dict[str, Any]]:
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    if not rows:
-        return []
-    colnames = [d[0] for d in cur.description]
-    return [{colnames[i]: r[i] for i in range(len(colnames))} for r in rows]
-
-
 def human_secs(seconds: float) -> str:
     if seconds <= 0:
         return "0s"
@@ -77,35 +112,24 @@ def human_secs(seconds: float) -> str:
     return f"{sec}s"
 
 
-def compute_duration(start_iso: Optional[str], end_iso: Optional[str]) -> float:
-    sdt = iso_to_dt(start_iso)
-    edt = iso_to_dt(end_iso)
-    if not sdt or not edt:
-        return 0.0
-    return max(0.0, (edt - sdt).total_seconds())
-
-
 def ensure_dir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
-def export_csv(path: str, rows: List[Dict[str, Any]]) -> None:
-    if not rows:
-        return
-    fieldnames = list(rows[0].keys())
+def export_csv(path: str, cols: List[str], rows: List[Tuple[Any, ...]]) -> None:
     with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
+        w = csv.writer(f)
+        w.writerow(cols)
         w.writerows(rows)
 
 
 def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False, export: bool = False) -> None:
-    conn = sqlite3.connect(db_path)
+    conn = connect_db(db_path, readonly=True)
     cur = conn.cursor()
 
     # Resolve job_id
     if latest and job_id is None:
-        row = cur.execute("SELECT id FROM jobs ORDER BY id DESC LIMIT 1").fetchone()
+        row = cur.execute(LATEST_JOB_SQL).fetchone()
         if not row:
             print("No jobs found.")
             return
@@ -116,16 +140,7 @@ def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False,
         return
 
     # ---- JOB META ----
-    job = fetchone_dict(
-        cur,
-        """
-        SELECT id, job_name, status, material, notes,
-               created_ts_utc, started_ts_utc, finished_ts_utc
-        FROM jobs
-        WHERE id = ?
-        """,
-        (job_id,),
-    )
+    job = fetchone_dict(cur, JOB_SQL, (job_id,))
     if not job:
         print(f"Job {job_id} not found.")
         return
@@ -158,19 +173,12 @@ def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False,
         "laser_power", "power", "s", "s_value", "spindle", "spindle_speed", "rpm", "pwm"
     ])
 
-    telemetry_rows: List[Dict[str, Any]] = []
-    if ts_col and job_col:
-        q = f"""
-            SELECT *
-            FROM telemetry
-            WHERE {job_col} = ?
-            ORDER BY {ts_col} ASC
-        """
-        telemetry_rows = fetchall_dicts(cur, q, (job_id,))
+    tel_types = get_column_types(conn, "telemetry")
 
     print("\n--- Telemetry ---")
 
     # Initialize KPI fields for export
+    samples = 0
     tel_span = 0.0
     feed_avg = feed_max = None
     power_avg = power_max = None
@@ -180,13 +188,25 @@ def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False,
 
     eff_score = None  # 0..100
 
-    if not telemetry_rows:
+    groups: List[Tuple[Any, ...]] = []
+    if ts_col and job_col:
+        # Aggregate in SQLite: one scan, partial aggregates per state, combined here.
+        # Columns without numeric affinity may hold numbers as text,
+        # which only float() understands, so those are converted with NumPy below.
+        sql_num = {c: c if c and has_numeric_affinity(tel_types[c]) else None for c in (feed_col, power_col)}
+        groups = cur.execute(
+            telemetry_state_sql(ts_col, job_col, state_col, sql_num[feed_col], sql_num[power_col]),
+            (job_id,),
+        ).fetchall()
+        samples = sum(g[1] for g in groups)
+        first_ts = min((g[2] for g in groups if g[2] is not None), default=None)
+        last_ts = max((g[3] for g in groups if g[3] is not None), default=None)
+        feed_avg, feed_max = combine_numeric(groups, 4)
+        power_avg, power_max = combine_numeric(groups, 7)
+
+    if not samples:
         print("No telemetry samples for this job.")
     else:
-        first_ts = telemetry_rows[0].get(ts_col)
-        last_ts = telemetry_rows[-1].get(ts_col)
-        samples = len(telemetry_rows)
-
         tel_span = compute_duration(first_ts, last_ts)
 
         print(f"Samples   : {samples}")
@@ -201,34 +221,31 @@ def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False,
         else:
             print(f"Span      : {human_secs(tel_span)}")
 
-        def extract_numeric(colname: Optional[str]) -> List[float]:
-            if not colname:
-                return []
-            vals = []
-            for r in telemetry_rows:
-                v = r.get(colname)
-                try:
-                    if v is None:
-                        continue
-                    vals.append(float(v))
-                except (ValueError, TypeError):
-                    continue
-            return vals
-
-        feed_vals = extract_numeric(feed_col)
-        power_vals = extract_numeric(power_col)
-
-        if feed_col and feed_vals:
-            feed_avg = sum(feed_vals) / len(feed_vals)
-            feed_max = max(feed_vals)
+        text_cols = [c for c in (feed_col, power_col) if c and not sql_num[c]]
+        if text_cols:
+            cur.execute(
+                f"SELECT {select_list(text_cols, tel_cols)} FROM telemetry WHERE {quote_ident(job_col)} = ?",
+                (job_id,),
+            )
+            # streamed column-wise: running [sum, count, max] per column
+            acc = [[0.0, 0, None] for _ in text_cols]
+            while rows := cur.fetchmany(STREAM_BATCH):
+                for a, values in zip(acc, zip(*rows)):
+                    add_numeric(a, values)
+            for col, (total, n, vmax) in zip(text_cols, acc):
+                if n:
+                    if col == feed_col:
+                        feed_avg, feed_max = total / n, vmax
+                    if col == power_col:
+                        power_avg, power_max = total / n, vmax
+
+        if feed_col and feed_avg is not None:
             print(f"Feed avg  : {feed_avg:.2f}")
             print(f"Feed max  : {feed_max:.2f}")
         else:
             print("Feed      : (no feed column or numeric values)")
 
-        if power_col and power_vals:
-            power_avg = sum(power_vals) / len(power_vals)
-            power_max = max(power_vals)
+        if power_col and power_avg is not None:
             print(f"Power avg : {power_avg:.2f}")
             print(f"Power max : {power_max:.2f}")
         else:
@@ -239,28 +256,19 @@ def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False,
 
         # State breakdown + KPI v2
         if state_col:
+            # Classify each distinct state once instead of every sample
             counts: Dict[str, int] = {}
-            for r in telemetry_rows:
-                s = r.get(state_col)
+            buckets = [0, 0, 0]
+            for s, n, *_ in groups:
+                buckets[state_code(s)] += n
                 s = str(s) if s is not None else "UNKNOWN"
-                counts[s] = counts.get(s, 0) + 1
+                counts[s] = counts.get(s, 0) + n
 
             print("\nState counts:")
             for k, v in sorted(counts.items(), key=lambda x: (-x[1], x[0])):
                 print(f"  - {k}: {v}")
 
-            active = 0
-            idle = 0
-            alarm = 0
-
-            for r in telemetry_rows:
-                s = str(r.get(state_col) or "").lower()
-                if "alarm" in s:
-                    alarm += 1
-                elif "idle" in s:
-                    idle += 1
-                else:
-                    active += 1
+            active, idle, alarm = buckets
 
             total = active + idle + alarm
             active_pct = 100.0 * safe_div(active, total)
@@ -297,40 +305,45 @@ def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False,
     evt_msg_col = pick_first(evt_cols, ["message", "msg", "detail", "details", "text"])
 
     print("\n--- Events ---")
-    events: List[Dict[str, Any]] = []
+    event_count = alarm_events = 0
+    evt_q = ""
     if evt_job_col and evt_ts_col:
-        q = f"""
-            SELECT *
+        evt_sel = [c for c in (evt_ts_col, evt_type_col, evt_msg_col) if c]
+        type_i = evt_sel.index(evt_type_col) if evt_type_col else None
+        msg_i = evt_sel.index(evt_msg_col) if evt_msg_col else None
+
+        # Totals in SQL; only the displayed rows are fetched
+        preds = [f"instr(LOWER(COALESCE({quote_ident(c)}, '')), 'alarm') > 0" for c in (evt_type_col, evt_msg_col) if c]
+        alarm_sql = f"COALESCE(SUM({' OR '.join(preds)}), 0)" if preds else "0"
+        event_count, alarm_events = cur.execute(
+            f"SELECT COUNT(*), {alarm_sql} FROM events WHERE {quote_ident(evt_job_col)} = ?", (job_id,)
+        ).fetchone()
+
+        evt_q = f"""
+            SELECT {select_list(evt_sel, evt_cols)}
             FROM events
-            WHERE {evt_job_col} = ?
-            ORDER BY {evt_ts_col} ASC
+            WHERE {quote_ident(evt_job_col)} = ?
+            ORDER BY {quote_ident(evt_ts_col)} ASC
         """
-        events = fetchall_dicts(cur, q, (job_id,))
-        if not events:
+        if not event_count:
             print("No events for this job.")
         else:
-            print(f"Events: {len(events)}")
-            for e in events[:50]:
-                ts = e.get(evt_ts_col)
-                et = e.get(evt_type_col) if evt_type_col else None
-                msg = e.get(evt_msg_col) if evt_msg_col else None
+            print(f"Events: {event_count}")
+            lines = []
+            for e in cur.execute(f"{evt_q} LIMIT 50", (job_id,)):
+                ts = e[0]
+                et = e[type_i] if type_i is not None else None
+                msg = e[msg_i] if msg_i is not None else None
                 et_s = str(et) if et is not None else "EVENT"
                 msg_s = str(msg) if msg is not None else ""
-                print(f"  [{ts}] {et_s}: {msg_s}".rstrip())
-            if len(events) > 50:
-                print(f"  ... ({len(events) - 50} more)")
+                lines.append(f"  [{ts}] {et_s}: {msg_s}".rstrip() + "\n")
+            sys.stdout.write("".join(lines))
+            if event_count > 50:
+                print(f"  ... ({event_count - 50} more)")
     else:
         print("Events table exists, but required columns not found (need job_id + timestamp).")
 
-    # Alarm events + alarm rate per minute (based on events)
-    alarm_events = 0
-    if events:
-        for e in events:
-            et = str(e.get(evt_type_col) or "").lower() if evt_type_col else ""
-            msg = str(e.get(evt_msg_col) or "").lower() if evt_msg_col else ""
-            if "alarm" in et or "alarm" in msg:
-                alarm_events += 1
-
+    # Alarm rate per minute (based on events)
     duration_min = duration_total / 60.0 if duration_total else 0.0
     alarm_rate_per_min = (alarm_events / duration_min) if duration_min else 0.0
 
@@ -346,8 +359,26 @@ def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False,
         evt_path = os.path.join(outdir, f"job_{job_id}_events.csv")
         kpi_path = os.path.join(outdir, f"job_{job_id}_kpis.json")
 
-        export_csv(tel_path, telemetry_rows)
-        export_csv(evt_path, events)
+        # Full rows (every column) are only needed for the raw CSV dump
+        if samples:
+            q = f"""
+                SELECT {select_list(tel_cols, tel_cols)}
+                FROM telemetry
+                WHERE {quote_ident(job_col)} = ?
+                ORDER BY {quote_ident(ts_col)} ASC
+            """
+            tel_fields, telemetry_rows = fetch_rows(cur, q, (job_id,))
+            if telemetry_rows:
+                export_csv(tel_path, tel_fields, telemetry_rows)
+        if event_count:
+            q = f"""
+                SELECT {select_list(evt_cols, evt_cols)}
+                FROM events
+                WHERE {quote_ident(evt_job_col)} = ?
+                ORDER BY {quote_ident(evt_ts_col)} ASC
+            """
+            evt_fields, events = fetch_rows(cur, q, (job_id,))
+            export_csv(evt_path, evt_fields, events)
 
         kpis = {
             "job_id": job_id,
@@ -362,7 +393,7 @@ def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False,
             "duration_seconds": duration_total,
             "duration_human": human_secs(duration_total),
 
-            "telemetry_samples": len(telemetry_rows),
+            "telemetry_samples": samples,
             "telemetry_span_seconds": tel_span,
             "telemetry_span_human": human_secs(tel_span),
 
@@ -393,8 +424,7 @@ def drilldown(db_path: str, job_id: Optional[int] = None, latest: bool = False,
             },
         }
 
-        with open(kpi_path, "w", encoding="utf-8") as f:
-            json.dump(kpis, f, indent=2)
+        write_json(kpi_path, kpis)
 
         print("\n--- Export ---")
         print(f"Telemetry CSV : {tel_path}")
@@ -1,16 +1,53 @@
 import sqlite3
-from datetime import datetime
+
+import numpy as np
+
+from cnc_iiot.summary import TELEMETRY_STATS_SQL
 
 DB = "cnc_iiot.db"
 JOB_ID = 1  # change this when you have more jobs
 
-
-def parse_iso(ts: str):
-    # handles "2025-12-27T18:33:31+00:00" and also legacy "2025-12-27T19:23:08"
+# Segment lengths between consecutive samples, summed inside SQLite.
+# A NULL coordinate on either end makes that segment NULL, which SUM skips.
+TRAVEL_SQL = """
+    WITH t AS (
+        SELECT mpos_x, mpos_y, mpos_z,
+               LAG(mpos_x) OVER w AS px,
+               LAG(mpos_y) OVER w AS py,
+               LAG(mpos_z) OVER w AS pz
+        FROM telemetry
+        WHERE job_id=?
+        WINDOW w AS (ORDER BY id)
+    )
+    SELECT TOTAL(SQRT((mpos_x-px)*(mpos_x-px) + (mpos_y-py)*(mpos_y-py) + (mpos_z-pz)*(mpos_z-pz)))
+    FROM t
+    WHERE px IS NOT NULL
+"""
+
+MPOS_SQL = """
+    SELECT mpos_x, mpos_y, mpos_z
+    FROM telemetry
+    WHERE job_id=?
+    ORDER BY id ASC
+"""
+
+
+def travel_distance(cur, job_id) -> float:
     try:
-        return datetime.fromisoformat(ts)
-    except Exception:
-        return None
+        return cur.execute(TRAVEL_SQL, (job_id,)).fetchone()[0]
+    except sqlite3.OperationalError as e:
+        # SQRT needs SQLite built with math functions (3.35+); otherwise do it in NumPy
+        if "no such function" not in str(e).lower():
+            raise
+
+    # Stream the cursor straight into one float64 buffer (no list of row tuples).
+    # None -> NaN, so any segment touching a missing coordinate is NaN and nansum skips it
+    rows = cur.execute(MPOS_SQL, (job_id,))
+    pos = np.fromiter(
+        (np.nan if v is None else v for row in rows for v in row), dtype=np.float64
+    ).reshape(-1, 3)
+    d = np.diff(pos, axis=0)
+    return float(np.nansum(np.sqrt((d * d).sum(axis=1))))
 
 
 def main():
@@ -43,50 +80,22 @@ def main():
     print(f"Finished : {finished_ts}")
 
     # Telemetry summary
-    tel_count = cur.execute("SELECT COUNT(*) FROM telemetry WHERE job_id=?", (JOB_ID,)).fetchone()[0]
+    tel_rows = cur.execute(TELEMETRY_STATS_SQL, (JOB_ID,)).fetchall()
+    tel_count, t0, t1 = tel_rows[0][2:] if tel_rows else (0, None, None)
     print("\n--- Telemetry ---")
     print("Samples:", tel_count)
 
     if tel_count > 0:
-        tel_minmax = cur.execute("""
-            SELECT MIN(ts_utc), MAX(ts_utc)
-            FROM telemetry
-            WHERE job_id=?
-        """, (JOB_ID,)).fetchone()
-        t0, t1 = tel_minmax[0], tel_minmax[1]
         print("First ts_utc:", t0)
         print("Last  ts_utc:", t1)
 
         # Count by state
         print("\nSamples by state:")
-        for r in cur.execute("""
-            SELECT state, COUNT(*) as c
-            FROM telemetry
-            WHERE job_id=?
-            GROUP BY state
-            ORDER BY c DESC
-        """, (JOB_ID,)):
-            print(" ", r[0], "=", r[1])
+        for state, c, _, _, _ in tel_rows:
+            print(" ", state, "=", c)
 
         # Basic travel distance estimate from mpos
-        rows = cur.execute("""
-            SELECT mpos_x, mpos_y, mpos_z
-            FROM telemetry
-            WHERE job_id=?
-            ORDER BY id ASC
-        """, (JOB_ID,)).fetchall()
-
-        dist = 0.0
-        for i in range(1, len(rows)):
-            x0, y0, z0 = rows[i - 1]
-            x1, y1, z1 = rows[i]
-            if None in (x0, y0, z0, x1, y1, z1):
-                continue
-            dx = (x1 - x0)
-            dy = (y1 - y0)
-            dz = (z1 - z0)
-            dist += (dx*dx + dy*dy + dz*dz) ** 0.5
-
+        dist = travel_distance(cur, JOB_ID)
         print(f"\nEstimated travel distance (mm): {dist:.3f}")
 
         # Latest snapshot
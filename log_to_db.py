@@ -2,6 +2,10 @@ from pathlib import Path
 from datetime import datetime, timezone
 import sqlite3
 
+from cnc_iiot.db import connect_db, ensure_indexes, optimize_db
+from cnc_iiot.grbl_parse import parse_grbl_line
+from cnc_iiot.summary import table_columns
+
 LOG_PATH = Path("grbl_sample.log")
 DB_PATH = Path("cnc_iiot.db")
 
@@ -10,13 +14,19 @@ def now_utc_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
+def now_stamps() -> tuple[str, str]:
+    # (ts local, ts_utc) - both at second resolution
+    return datetime.now().isoformat(timespec="seconds"), now_utc_iso()
+
+
 def ensure_app_state(conn: sqlite3.Connection) -> None:
     conn.execute("CREATE TABLE IF NOT EXISTS app_state (key TEXT PRIMARY KEY, value TEXT)")
     conn.commit()
 
 
 def get_active_job_id(conn: sqlite3.Connection) -> int | None:
-    ensure_app_state(conn)
+    # app_state is created by init_db(); no per-call CREATE/commit here, which would
+    # end the ingest transaction on every line
     row = conn.execute("SELECT value FROM app_state WHERE key='active_job_id'").fetchone()
     if not row or row[0] is None:
         return None
@@ -28,6 +38,84 @@ def get_active_job_id(conn: sqlite3.Connection) -> int | None:
 
 def init_db(conn: sqlite3.Connection) -> None:
     ensure_app_state(conn)
+    ensure_indexes(conn)
+
+
+EVENT_INSERT_SQL = """
+    INSERT INTO events (ts, event_type, message, raw, ts_utc, level, category, code, job_id, meta_json)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+TELEMETRY_INSERT_SQL = """
+    INSERT INTO telemetry (
+        ts, state, feed, spindle, raw,
+        ts_utc, source,
+        mpos_x, mpos_y, mpos_z,
+        job_id
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Same row tuple, for DBs migrate_schema_v2 hasn't touched yet: the legacy x,y,z
+# columns still exist there, so they get the mpos values (?8-?10) too
+TELEMETRY_INSERT_SQL_LEGACY_XYZ = """
+    INSERT INTO telemetry (
+        ts, state, feed, spindle, raw,
+        ts_utc, source,
+        mpos_x, mpos_y, mpos_z,
+        job_id,
+        x, y, z
+    )
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?8, ?9, ?10)
+"""
+
+# main() buffers this many parsed lines before each executemany flush
+FLUSH_EVERY = 1000
+
+# main() streams the log through a 1 MiB read buffer instead of loading it whole
+READ_BUFFER = 1 << 20
+
+
+def telemetry_insert_sql(conn: sqlite3.Connection) -> str:
+    return TELEMETRY_INSERT_SQL_LEGACY_XYZ if "x" in table_columns(conn, "telemetry") else TELEMETRY_INSERT_SQL
+
+
+def event_row(
+    event_type: str,
+    message: str,
+    raw: str,
+    level: str = "info",
+    category: str = "system",
+    code: str | None = None,
+    meta_json: str | None = None,
+    *,
+    job_id: int | None,
+    ts: str,
+    ts_utc: str,
+) -> tuple:
+    raw = raw if raw is not None else ""
+    return (ts, event_type, message, raw, ts_utc, level, category, code, job_id, meta_json)
+
+
+def telemetry_row(
+    state: str,
+    x: float,
+    y: float,
+    z: float,
+    feed: int,
+    spindle: int,
+    raw: str,
+    *,
+    job_id: int | None,
+    ts: str,
+    ts_utc: str,
+) -> tuple:
+    return (
+        ts, state, int(feed), int(spindle), raw,
+        ts_utc, "grbl",
+        x, y, z,
+        job_id
+    )
 
 
 def log_event(
@@ -40,18 +128,12 @@ def log_event(
     code: str | None = None,
     meta_json: str | None = None,
 ) -> None:
-    ts = datetime.now().isoformat(timespec="seconds")
-    ts_utc = now_utc_iso()
-    job_id = get_active_job_id(conn)
-    raw = raw if raw is not None else ""
-
-    conn.execute(
-        """
-        INSERT INTO events (ts, event_type, message, raw, ts_utc, level, category, code, job_id, meta_json)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (ts, event_type, message, raw, ts_utc, level, category, code, job_id, meta_json),
+    ts, ts_utc = now_stamps()
+    row = event_row(
+        event_type, message, raw, level, category, code, meta_json,
+        job_id=get_active_job_id(conn), ts=ts, ts_utc=ts_utc,
     )
+    conn.execute(EVENT_INSERT_SQL, row)
 
 
 def log_telemetry(
@@ -64,35 +146,41 @@ def log_telemetry(
     spindle: int,
     raw: str,
 ) -> None:
-    ts = datetime.now().isoformat(timespec="seconds")
-    ts_utc = now_utc_iso()
-    job_id = get_active_job_id(conn)
-
-    conn.execute(
-        """
-        INSERT INTO telemetry (
-            ts, state, x, y, z, feed, spindle, raw,
-            ts_utc, source,
-            mpos_x, mpos_y, mpos_z,
-            job_id
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            ts, state, x, y, z, int(feed), int(spindle), raw,
-            ts_utc, "grbl",
-            x, y, z,
-            job_id
-        ),
-    )
+    ts, ts_utc = now_stamps()
+    row = telemetry_row(state, x, y, z, feed, spindle, raw, job_id=get_active_job_id(conn), ts=ts, ts_utc=ts_utc)
+    conn.execute(telemetry_insert_sql(conn), row)
+
+
+def flush_rows(cur: sqlite3.Cursor, tele_rows: list[tuple], event_rows: list[tuple]) -> None:
+    if tele_rows:
+        cur.executemany(telemetry_insert_sql(cur.connection), tele_rows)
+        tele_rows.clear()
+    if event_rows:
+        cur.executemany(EVENT_INSERT_SQL, event_rows)
+        event_rows.clear()
+
+
+JOB_TELEMETRY_RANGE_SQL = """
+    SELECT MIN(ts_utc), MAX(ts_utc), COUNT(*)
+    FROM telemetry
+    WHERE job_id=?
+"""
+
+JOB_FINALIZE_SQL = """
+    UPDATE jobs
+    SET
+        started_ts_utc = COALESCE(started_ts_utc, ?),
+        finished_ts_utc = ?,
+        status = CASE
+            WHEN status IN ('created','running','paused') THEN 'finished'
+            ELSE status
+        END
+    WHERE id=?
+"""
 
 
 def finalize_job_from_telemetry(conn: sqlite3.Connection, job_id: int) -> None:
-    row = conn.execute("""
-        SELECT MIN(ts_utc), MAX(ts_utc), COUNT(*)
-        FROM telemetry
-        WHERE job_id=?
-    """, (job_id,)).fetchone()
+    row = conn.execute(JOB_TELEMETRY_RANGE_SQL, (job_id,)).fetchone()
 
     if not row:
         return
@@ -101,67 +189,29 @@ def finalize_job_from_telemetry(conn: sqlite3.Connection, job_id: int) -> None:
     if not t_start or not t_end or n == 0:
         return
 
-    conn.execute("""
-        UPDATE jobs
-        SET
-            started_ts_utc = COALESCE(started_ts_utc, ?),
-            finished_ts_utc = ?,
-            status = CASE
-                WHEN status IN ('created','running','paused') THEN 'finished'
-                ELSE status
-            END
-        WHERE id=?
-    """, (t_start, t_end, job_id))
-
-    ts_local = datetime.now().isoformat(timespec="seconds")
-    ts_utc = now_utc_iso()
-    conn.execute("""
-        INSERT INTO events (ts, ts_utc, event_type, message, raw, level, category, code, job_id, meta_json)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        ts_local, ts_utc,
+    conn.execute(JOB_FINALIZE_SQL, (t_start, t_end, job_id))
+
+    ts_local, ts_utc = now_stamps()
+    conn.execute(EVENT_INSERT_SQL, event_row(
         "job",
         f"Job auto-finalized from telemetry (samples={n})",
         "",
-        "info", "job", "AUTO_FINALIZE", job_id, None
+        "info", "job", "AUTO_FINALIZE",
+        job_id=job_id, ts=ts_local, ts_utc=ts_utc,
     ))
 
 
-def parse_status(line: str):
-    content = line.strip("<>")
-    parts = content.split("|")
-    state = parts[0]
-
-    pos_part = next(p for p in parts if p.startswith("MPos:"))
-    fs_part = next(p for p in parts if p.startswith("FS:"))
-
-    x, y, z = map(float, pos_part.replace("MPos:", "").split(","))
-    feed, spindle = map(int, fs_part.replace("FS:", "").split(","))
-
-    return state, x, y, z, feed, spindle
-
-
 # ✅ THIS IS THE IMPORTANT NEW FUNCTION
 def process_grbl_line(conn: sqlite3.Connection, line: str) -> None:
-    line = line.strip()
-    if not line:
+    # single-line insert; main() buffers the same rows and uses executemany
+    parsed = parse_grbl_line(line)
+    if parsed is None:
         return
-
-    if line.lower().startswith("grbl"):
-        log_event(conn, "startup", "GRBL startup banner", line, category="system")
-
-    elif line == "ok":
-        log_event(conn, "ok", "Command acknowledged", line, category="system")
-
-    elif line.startswith("ALARM:"):
-        log_event(conn, "alarm", line, line, level="error", category="grbl", code="ALARM")
-
-    elif line.startswith("<") and line.endswith(">"):
-        state, x, y, z, feed, spindle = parse_status(line)
-        log_telemetry(conn, state, x, y, z, feed, spindle, line)
-
+    kind, fields = parsed
+    if kind == "tel":
+        log_telemetry(conn, *fields)
     else:
-        log_event(conn, "raw", "Unclassified line", line, category="system")
+        log_event(conn, *fields)
 
 
 def main() -> None:
@@ -169,19 +219,42 @@ def main() -> None:
         print("Could not find grbl_sample.log in this folder.")
         return
 
-    conn = sqlite3.connect(DB_PATH)
+    # WAL + synchronous=NORMAL etc. via connect_db
+    conn = connect_db(DB_PATH)
     try:
         init_db(conn)
         active_job_id = get_active_job_id(conn)
         print("Active job_id:", active_job_id)
 
-        for raw in LOG_PATH.read_text(encoding="utf-8").splitlines():
-            process_grbl_line(conn, raw)
-
-        if active_job_id is not None:
-            finalize_job_from_telemetry(conn, active_job_id)
-
-        conn.commit()
+        # one transaction for the whole file instead of a commit per line
+        with conn:
+            # one cursor for every batch; the SQL text is constant, so sqlite3's
+            # per-connection statement cache hands back the prepared statements
+            cur = conn.cursor()
+            tele_rows: list[tuple] = []
+            event_rows: list[tuple] = []
+            # active job is read once above; timestamps once per flush batch, not per line
+            ts, ts_utc = now_stamps()
+            with LOG_PATH.open(encoding="utf-8", buffering=READ_BUFFER) as f:
+                for raw in f:
+                    parsed = parse_grbl_line(raw)
+                    if parsed is None:
+                        continue
+                    kind, fields = parsed
+                    if kind == "tel":
+                        tele_rows.append(telemetry_row(*fields, job_id=active_job_id, ts=ts, ts_utc=ts_utc))
+                    else:
+                        event_rows.append(event_row(*fields, job_id=active_job_id, ts=ts, ts_utc=ts_utc))
+                    if len(tele_rows) + len(event_rows) >= FLUSH_EVERY:
+                        flush_rows(cur, tele_rows, event_rows)
+                        ts, ts_utc = now_stamps()
+            flush_rows(cur, tele_rows, event_rows)
+
+            if active_job_id is not None:
+                finalize_job_from_telemetry(conn, active_job_id)
+
+        # refresh planner stats for the rows just added (reports only open read-only)
+        optimize_db(conn)
         print("Done Logged to database:", DB_PATH.resolve())
 
     finally:
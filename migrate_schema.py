@@ -1,6 +1,8 @@
 import sqlite3
 from datetime import datetime
 
+from cnc_iiot.db import optimize_db
+
 DB = "cnc_iiot.db"
 
 SCHEMA = """
@@ -58,15 +60,26 @@ CREATE INDEX IF NOT EXISTS idx_telemetry_job ON telemetry(job_id);
 CREATE INDEX IF NOT EXISTS idx_events_job ON events(job_id);
 """
 
+def split_statements(script: str):
+    # complete_statement() knows about quotes/comments, so ';' inside them doesn't split
+    stmts, buf = [], ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            stmts.append(buf.strip())
+            buf = ""
+    return stmts
+
 def safe_exec(cur, sql: str):
-    # SQLite will throw if column already exists; ignore those cases
-    try:
-        cur.executescript(sql)
-    except sqlite3.OperationalError as e:
-        # common on ALTER TABLE ADD COLUMN duplicates
-        if "duplicate column name" in str(e).lower():
-            pass
-        else:
+    # One statement at a time: a re-run hits "duplicate column name" on the ALTERs,
+    # and with executescript() that error also skipped every statement after it
+    for stmt in split_statements(sql):
+        try:
+            cur.execute(stmt)
+        except sqlite3.OperationalError as e:
+            # common on ALTER TABLE ADD COLUMN duplicates
+            if "duplicate column name" in str(e).lower():
+                continue
             raise
 
 def main():
@@ -82,6 +95,7 @@ def main():
     ).fetchall()
     print("Tables:", [t[0] for t in tables])
 
+    optimize_db(conn)
     conn.close()
     print("✅ Schema upgrade done.")
 
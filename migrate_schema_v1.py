@@ -1,5 +1,7 @@
 import sqlite3
 
+from cnc_iiot.db import ensure_indexes, optimize_db
+
 DB = "cnc_iiot.db"
 
 def col_exists(cur, table, col):
@@ -43,14 +45,13 @@ def main():
     add_col(cur, "telemetry", "line INTEGER")
     add_col(cur, "telemetry", "job_id INTEGER")
 
-    # Map your existing x,y,z into mpos_x,y,z (keeps old columns too)
-    cur.execute("""
+    # Map your existing x,y,z into mpos_x,y,z (keeps old columns too).
+    # migrate_schema_v2 drops x,y,z, so only back-fill the ones still there (safe to re-run)
+    legacy = [c for c in ("x", "y", "z") if col_exists(cur, "telemetry", c)]
+    cur.execute(f"""
         UPDATE telemetry
         SET
-            ts_utc = COALESCE(ts_utc, ts),
-            mpos_x = COALESCE(mpos_x, x),
-            mpos_y = COALESCE(mpos_y, y),
-            mpos_z = COALESCE(mpos_z, z)
+            {", ".join(["ts_utc = COALESCE(ts_utc, ts)"] + [f"mpos_{c} = COALESCE(mpos_{c}, {c})" for c in legacy])}
     """)
 
     # 2) Events: add new columns
@@ -94,7 +95,11 @@ def main():
     create_index(cur, "CREATE INDEX IF NOT EXISTS idx_events_category ON events(category)", "idx_events_category")
     create_index(cur, "CREATE INDEX IF NOT EXISTS idx_events_job ON events(job_id)", "idx_events_job")
 
+    # 5) Composite indexes for per-job report queries
+    ensure_indexes(conn)
+
     conn.commit()
+    optimize_db(conn)
     conn.close()
     print("✅ Migration to v1 done (no data deleted).")
 
@@ -0,0 +1,80 @@
+import sqlite3
+
+from cnc_iiot.db import connect_db, optimize_db
+
+DB = "cnc_iiot.db"
+
+# v1 copied these into mpos_x/y/z; nothing reads them any more
+LEGACY_TELEMETRY_COLS = ("x", "y", "z")
+
+# Same rule the summaries use: 'alarm' anywhere in event_type or message.
+# VIRTUAL -> computed on read, nothing stored in the row; only the index below materializes it.
+ALARM_FLAG_COL = """
+    is_alarm INTEGER GENERATED ALWAYS AS (
+        instr(lower(coalesce(event_type, '')), 'alarm') > 0
+        OR instr(lower(coalesce(message, '')), 'alarm') > 0
+    ) VIRTUAL
+"""
+
+def col_exists(cur, table, col):
+    # table_xinfo, not table_info: the latter hides generated columns
+    cols = [r[1] for r in cur.execute(f"PRAGMA table_xinfo({table})").fetchall()]
+    return col in cols
+
+def drop_legacy_xyz(cur):
+    legacy = [c for c in LEGACY_TELEMETRY_COLS if col_exists(cur, "telemetry", c)]
+    if not legacy:
+        return []
+
+    # Same back-fill as v1, so rows logged in between aren't lost
+    cur.execute(f"""
+        UPDATE telemetry
+        SET {", ".join(f"mpos_{c} = COALESCE(mpos_{c}, {c})" for c in legacy)}
+        WHERE {" OR ".join(f"mpos_{c} IS NULL" for c in legacy)}
+    """)
+
+    for c in legacy:
+        cur.execute(f"ALTER TABLE telemetry DROP COLUMN {c}")
+    return legacy
+
+def add_alarm_flag(cur):
+    if col_exists(cur, "events", "is_alarm"):
+        return False
+    if not (col_exists(cur, "events", "event_type") and col_exists(cur, "events", "message")):
+        return False
+
+    cur.execute(f"ALTER TABLE events ADD COLUMN {ALARM_FLAG_COL}")
+    # Partial index: only alarm rows, so per-job alarm counts touch nothing else
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_events_alarm ON events(job_id) WHERE is_alarm = 1")
+    return True
+
+def main():
+    # ALTER TABLE ... DROP COLUMN needs SQLite 3.35+
+    if sqlite3.sqlite_version_info < (3, 35, 0):
+        print(f"❌ SQLite {sqlite3.sqlite_version} can't DROP COLUMN (needs 3.35+). Nothing changed.")
+        return
+
+    conn = connect_db(DB)
+    cur = conn.cursor()
+
+    with conn:
+        dropped = drop_legacy_xyz(cur)
+        flagged = add_alarm_flag(cur)
+
+    if dropped:
+        # DROP COLUMN rewrites every row; hand the freed pages back
+        cur.execute("VACUUM")
+    optimize_db(conn)
+    conn.close()
+
+    if not dropped and not flagged:
+        print("✅ Already on v2.")
+        return
+    if dropped:
+        print("✅ Dropped telemetry." + ", telemetry.".join(dropped))
+    if flagged:
+        print("✅ Added events.is_alarm + idx_events_alarm")
+    print("✅ Migration to v2 done.")
+
+if __name__ == "__main__":
+    main()
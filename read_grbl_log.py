@@ -1,5 +1,7 @@
 from pathlib import Path
 
+from cnc_iiot.grbl_parse import parse_grbl_line
+
 LOG_PATH = Path("grbl_sample.log")
 
 def main() -> None:
@@ -9,41 +11,32 @@ def main() -> None:
 
     print("Reading GRBL log...\n")
 
-    for line in LOG_PATH.read_text(encoding="utf-8").splitlines():
-        line = line.strip()
-        if not line:
-            continue
-
-        # Simple "event decoding"
-        if line.lower().startswith("grbl"):
-            print(f"[STARTUP] {line}")
-
-        elif line == "ok":
-            print("[OK] Command acknowledged")
-
-        elif line.startswith("ALARM:"):
-            print(f"[ALARM] {line}")
-
-        elif line.startswith("<") and line.endswith(">"):
-            content = line.strip("<>")
-            parts = content.split("|")
-
-            state = parts[0]
-
-            pos_part = next(p for p in parts if p.startswith("MPos:"))
-            fs_part = next(p for p in parts if p.startswith("FS:"))
-
-            x, y, z = map(float, pos_part.replace("MPos:", "").split(","))
-            feed, spindle = map(int, fs_part.replace("FS:", "").split(","))
-
-            print(
-                f"[STATUS] state={state} "
-                f"x={x:.3f} y={y:.3f} z={z:.3f} "
-                f"feed={feed} spindle={spindle}"
-            )
-
-        else:
-            print(f"[RAW] {line}")
+    with LOG_PATH.open(encoding="utf-8") as f:
+        for line in f:
+            # Simple "event decoding" (same classifier log_to_db uses)
+            parsed = parse_grbl_line(line)
+            if parsed is None:
+                continue
+            kind, fields = parsed
+
+            if kind == "tel":
+                state, x, y, z, feed, spindle, _ = fields
+                print(
+                    f"[STATUS] state={state} "
+                    f"x={x:.3f} y={y:.3f} z={z:.3f} "
+                    f"feed={feed} spindle={spindle}"
+                )
+                continue
+
+            event_type, message, raw = fields[:3]
+            if event_type == "startup":
+                print(f"[STARTUP] {raw}")
+            elif event_type == "ok":
+                print(f"[OK] {message}")
+            elif event_type == "alarm":
+                print(f"[ALARM] {raw}")
+            else:
+                print(f"[RAW] {raw}")
 
     print("\nDone ✅")
 
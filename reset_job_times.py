@@ -1,9 +1,9 @@
-import sqlite3
+from cnc_iiot.db import get_writer
 
 DB = "cnc_iiot.db"
 JOB_ID = 1
 
-conn = sqlite3.connect(DB)
+conn = get_writer(DB)
 cur = conn.cursor()
 
 cur.execute("""
@@ -13,5 +13,4 @@ cur.execute("""
 """, (JOB_ID,))
 
 conn.commit()
-conn.close()
 print("✅ Reset started/finished timestamps for job", JOB_ID)
@@ -1,5 +1,6 @@
 # run_ingest.py
 import argparse
+from cnc_iiot.db import get_writer
 from cnc_iiot.grbl_sources import file_source, serial_source
 
 # IMPORTANT:
@@ -53,8 +54,15 @@ def main():
             raise SystemExit("Provide --port when mode=serial (e.g. COM3)")
         src = serial_source(args.port, baud=args.baud)
 
+    # the pool's shared writer; a dashboard reading the same DB uses its own read-only handle
+    from log_to_db import init_db
+    conn = get_writer()
+    init_db(conn)
+
     for line in src:
-        processor(line)
+        # commit per line so a live reader sees each sample as it arrives
+        with conn:
+            processor(conn, line)
 
 
 if __name__ == "__main__":
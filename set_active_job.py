@@ -1,9 +1,9 @@
-import sqlite3
+from cnc_iiot.db import get_writer
 
 DB = "cnc_iiot.db"
 
 def set_active_job(job_id: int | None):
-    conn = sqlite3.connect(DB)
+    conn = get_writer(DB)
     cur = conn.cursor()
 
     cur.execute("CREATE TABLE IF NOT EXISTS app_state (key TEXT PRIMARY KEY, value TEXT)")
@@ -14,8 +14,8 @@ def set_active_job(job_id: int | None):
         cur.execute("INSERT OR REPLACE INTO app_state (key, value) VALUES ('active_job_id', ?)", (str(job_id),))
         print("Active job set to:", job_id)
 
+    # shared writer from the pool: commit, don't close
     conn.commit()
-    conn.close()
 
 if __name__ == "__main__":
     # Change this number when you want a different active job
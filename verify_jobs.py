@@ -1,6 +1,6 @@
-import sqlite3
+from cnc_iiot.db import get_reader
 
-conn = sqlite3.connect("cnc_iiot.db")
+conn = get_reader("cnc_iiot.db")
 cur = conn.cursor()
 
 print("Jobs rows:", cur.execute("SELECT COUNT(*) FROM jobs").fetchone()[0])
@@ -20,5 +20,3 @@ for r in cur.execute("""
     ORDER BY id DESC LIMIT 20
 """):
     print(r)
-
-conn.close()
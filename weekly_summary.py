@@ -12,23 +12,16 @@
 
 import argparse
 import csv
-import json
 import os
 import sqlite3
 from datetime import datetime, date, timedelta, UTC
-from typing import Optional, Any, Dict, List
-
-DB_PATH_DEFAULT = "cnc_iiot.db"
+from typing import Any, Dict, List
 
+from cnc_iiot.export import write_json
+from cnc_iiot.summary import alarm_counts_by_job, telemetry_spans_by_job
+from cnc_iiot.timeutil import compute_duration, iso_to_dt
 
-def iso_to_dt(s: Optional[str]) -> Optional[datetime]:
-    if not s:
-        return None
-    s2 = s.replace("Z", "+00:00")
-    try:
-        return datetime.fromisoformat(s2)
-    except ValueError:
-        return None
+DB_PATH_DEFAULT = "cnc_iiot.db"
 
 
 def ensure_dir(path: str) -> None:
@@ -53,14 +46,6 @@ def human_secs(seconds: float) -> str:
     return f"{sec}s"
 
 
-def compute_duration(start_iso: Optional[str], end_iso: Optional[str]) -> float:
-    sdt = iso_to_dt(start_iso)
-    edt = iso_to_dt(end_iso)
-    if not sdt or not edt:
-        return 0.0
-    return max(0.0, (edt - sdt).total_seconds())
-
-
 def export_csv(path: str, rows: List[Dict[str, Any]]) -> None:
     if not rows:
         return
@@ -97,63 +82,6 @@ def filter_jobs_by_date_range(jobs: List[Dict[str, Any]], start_date: date, end_
     return out
 
 
-def telemetry_span_seconds(conn: sqlite3.Connection, job_id: int, sample_interval_s_default: float = 1.0) -> float:
-    cur = conn.cursor()
-    cols = [r[1] for r in cur.execute("PRAGMA table_info(telemetry)").fetchall()]
-    lower = {c.lower(): c for c in cols}
-
-    job_col = lower.get("job_id")
-    ts_col = lower.get("ts_utc") or lower.get("timestamp_utc") or lower.get("timestamp") or lower.get("ts")
-
-    if not job_col or not ts_col:
-        return 0.0
-
-    rows = cur.execute(
-        f"SELECT {ts_col} FROM telemetry WHERE {job_col} = ? ORDER BY {ts_col} ASC",
-        (job_id,),
-    ).fetchall()
-
-    if not rows:
-        return 0.0
-
-    samples = len(rows)
-    first_ts = rows[0][0]
-    last_ts = rows[-1][0]
-
-    span = compute_duration(first_ts, last_ts)
-    if span == 0.0 and samples > 1:
-        span = (samples - 1) * sample_interval_s_default
-    return span
-
-
-def count_alarm_events(conn: sqlite3.Connection, job_id: int) -> int:
-    cur = conn.cursor()
-    cols = [r[1] for r in cur.execute("PRAGMA table_info(events)").fetchall()]
-    lower = {c.lower(): c for c in cols}
-
-    job_col = lower.get("job_id")
-    type_col = lower.get("event_type") or lower.get("type") or lower.get("level") or lower.get("category")
-    msg_col = lower.get("message") or lower.get("msg") or lower.get("detail") or lower.get("details") or lower.get("text")
-
-    if not job_col:
-        return 0
-
-    q = f"SELECT * FROM events WHERE {job_col} = ?"
-    rows = cur.execute(q, (job_id,)).fetchall()
-    if not rows:
-        return 0
-
-    desc = [d[0] for d in cur.description]
-    alarms = 0
-    for r in rows:
-        d = {desc[i]: r[i] for i in range(len(desc))}
-        et = str(d.get(type_col) or "").lower() if type_col else ""
-        msg = str(d.get(msg_col) or "").lower() if msg_col else ""
-        if "alarm" in et or "alarm" in msg:
-            alarms += 1
-    return alarms
-
-
 def main():
     parser = argparse.ArgumentParser(description="CNC IIoT Weekly Summary Export (UTC)")
     parser.add_argument("--db", default=DB_PATH_DEFAULT, help="Path to SQLite DB (default: cnc_iiot.db)")
@@ -177,15 +105,21 @@ def main():
     jobs_all = fetch_jobs(conn)
     jobs = filter_jobs_by_date_range(jobs_all, start_date, end_date)
 
+    # job-table durations first; only jobs without one fall back to their telemetry span
+    durations = {
+        int(j["id"]): compute_duration(j.get("started_ts_utc"), j.get("finished_ts_utc")) for j in jobs
+    }
+    tel_spans = telemetry_spans_by_job(
+        conn, [jid for jid, dur in durations.items() if dur == 0.0], sample_interval_s_default=1.0
+    )
+    alarm_counts = alarm_counts_by_job(conn, list(durations))
+
     rows_out: List[Dict[str, Any]] = []
     for j in jobs:
         jid = int(j["id"])
 
-        dur = compute_duration(j.get("started_ts_utc"), j.get("finished_ts_utc"))
-        if dur == 0.0:
-            dur = telemetry_span_seconds(conn, jid, sample_interval_s_default=1.0)
-
-        alarms = count_alarm_events(conn, jid)
+        dur = durations[jid] or tel_spans.get(jid, 0.0)
+        alarms = alarm_counts.get(jid, 0)
 
         rows_out.append({
             "job_id": jid,
@@ -231,8 +165,7 @@ def main():
         json_path = os.path.join(outdir, base + ".json")
 
         export_csv(csv_path, rows_out)
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(rows_out, f, indent=2)
+        write_json(json_path, rows_out)
 
         print("\n--- Export ---")
         print(f"CSV : {csv_path}")